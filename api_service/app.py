@@ -1,6 +1,8 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from routes import main_router
+from services.citation_service import close_session
+from services.qa_service import close_openai_client
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -21,6 +23,11 @@ app.add_middleware(
 # Include all routes
 app.include_router(main_router)
 
+@app.on_event("shutdown")
+async def shutdown():
+    await close_session()
+    await close_openai_client()
+
 @app.get("/")
 async def root():
     return {"message": "GraphRAG API is running"}
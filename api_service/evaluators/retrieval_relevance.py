@@ -1,6 +1,26 @@
 from typing import Dict, List
 import math
 
+import numpy as np
+
+# Numba is optional; without it large lists stay on the NumPy path
+try:
+    import numba as nb
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# Below this size the NumPy path wins over JIT dispatch overhead
+NUMBA_MIN_CHUNKS = 1024
+
+if NUMBA_AVAILABLE:
+    @nb.njit(parallel=True, fastmath=True, cache=True)
+    def _score_kernel(sims: np.ndarray, thr: float) -> np.ndarray:
+        flags = np.empty(sims.shape[0], dtype=np.int8)
+        for i in nb.prange(sims.shape[0]):
+            flags[i] = 1 if sims[i] >= thr else 0
+        return flags
+
 class RetrievalRelevanceEvaluator:
     """Binary relevance evaluator.
     Starts with a cosine similarity threshold heuristic using existing similarity scores.
@@ -22,10 +42,36 @@ class RetrievalRelevanceEvaluator:
         }
 
     def evaluate_ranked_list(self, query: str, chunks: List[Dict]) -> List[Dict]:
-        results = []
-        for rank, ch in enumerate(chunks, start=1):
-            res = self.evaluate_retrieval(query, ch)
-            res["rank_position"] = rank
-            res["chunk_id"] = ch.get("id")
-            results.append(res)
-        return results 
\ No newline at end of file
+        # Threshold the whole ranked list in one vector op instead of per chunk
+        sims = np.fromiter(
+            (float(ch.get('similarity', 0.0)) for ch in chunks),
+            dtype=np.float64,
+            count=len(chunks),
+        )
+        if NUMBA_AVAILABLE and len(chunks) > NUMBA_MIN_CHUNKS:
+            flags = _score_kernel(sims, self.similarity_threshold).tolist()
+        else:
+            flags = (sims >= self.similarity_threshold).tolist()
+        threshold = self.similarity_threshold
+        return [
+            {
+                "relevance_score": int(flag),
+                "explanation": f"similarity={sim:.3f} threshold={threshold}",
+                "retrieval_method": "vector",
+                "rank_position": rank,
+                "chunk_id": ch.get("id"),
+            }
+            for rank, (ch, sim, flag) in enumerate(zip(chunks, sims.tolist(), flags), start=1)
+        ]
+
+    def evaluate_many(self, query_ids: np.ndarray, sims_2d: np.ndarray) -> np.ndarray:
+        """Score many ranked lists at once (struct-of-arrays layout).
+
+        query_ids is a length-N array identifying each row of sims_2d, an (N, K)
+        array of similarities in rank order. Shorter lists are padded with NaN,
+        which is never relevant. Returns an (N, K) int8 matrix of relevance labels.
+        """
+        sims_2d = np.asarray(sims_2d, dtype=np.float64)
+        if sims_2d.ndim != 2 or sims_2d.shape[0] != len(query_ids):
+            raise ValueError("sims_2d must be (len(query_ids), K)")
+        return (sims_2d >= self.similarity_threshold).astype(np.int8)
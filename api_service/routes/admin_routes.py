@@ -1,12 +1,11 @@
-from fastapi import APIRouter, Request
-from utils.admin import admin_manager
+from fastapi import APIRouter, Depends
+from utils.admin import admin_manager, admin_dep
 
 router = APIRouter()
 
 @router.get("/admin/status")
-async def get_admin_status(request: Request):
+async def get_admin_status(is_admin: bool = Depends(admin_dep)):
     """Check if the current request has admin access."""
-    is_admin = admin_manager.is_admin_request(request)
     return {
         "status": "success",
         "is_admin": is_admin,
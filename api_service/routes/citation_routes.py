@@ -2,26 +2,29 @@
 Citation management routes.
 """
 
-from fastapi import APIRouter, HTTPException, Request, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends
 from typing import Dict, Any, Optional
 import asyncio
 import logging
 
 from services.citation_fetcher import run_citation_fetcher_once
-from utils.document_db import get_documents_without_citations
-from utils.admin import AdminManager
+from utils.document_db import get_documents_without_citations, count_documents_without_citations
+from utils import get_db_connection
+from utils.admin import admin_required
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
-admin_manager = AdminManager()
+
+# In-flight /citations/fetch run for this worker, if any
+_fetch_task: Optional[asyncio.Task] = None
 
 
 @router.get("/citations/status")
 async def get_citation_status():
     """Get status of citation fetching process."""
     try:
-        pending_documents = get_documents_without_citations(limit=100)
-        total_pending = len(pending_documents)
+        total_pending = count_documents_without_citations()
+        pending_documents = get_documents_without_citations(limit=10)
         
         return {
             "status": "success",
@@ -33,7 +36,7 @@ async def get_citation_status():
                     "doi": doc["doi"],
                     "created_at": doc["created_at"].isoformat() if doc["created_at"] else None
                 }
-                for doc in pending_documents[:10]  # Show next 10
+                for doc in pending_documents
             ]
         }
     except Exception as e:
@@ -41,14 +44,21 @@ async def get_citation_status():
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/citations/fetch")
-async def trigger_citation_fetch(request: Request, background_tasks: BackgroundTasks):
+@router.post("/citations/fetch", dependencies=[Depends(admin_required("trigger citation fetch"))])
+async def trigger_citation_fetch():
     """Trigger citation fetching for pending documents."""
-    admin_manager.require_admin(request, "trigger citation fetch")
+    global _fetch_task
     
     try:
-        # Run citation fetcher in background
-        background_tasks.add_task(run_citation_fetcher_once)
+        # Repeated triggers while a run is in flight are no-ops; across workers
+        # run_citation_fetcher_once is serialized by an advisory lock.
+        if _fetch_task is not None and not _fetch_task.done():
+            return {
+                "status": "success",
+                "message": "Citation fetch already in progress"
+            }
+        
+        _fetch_task = asyncio.create_task(run_citation_fetcher_once())
         
         return {
             "status": "success",
@@ -59,10 +69,9 @@ async def trigger_citation_fetch(request: Request, background_tasks: BackgroundT
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/citations/fetch-sync")
-async def fetch_citations_sync(request: Request, limit: Optional[int] = 10):
+@router.post("/citations/fetch-sync", dependencies=[Depends(admin_required("synchronous citation fetch"))])
+async def fetch_citations_sync(limit: Optional[int] = 10):
     """Fetch citations synchronously (for testing)."""
-    admin_manager.require_admin(request, "synchronous citation fetch")
     
     try:
         from services.citation_fetcher import CitationFetcher
@@ -81,11 +90,9 @@ async def fetch_citations_sync(request: Request, limit: Optional[int] = 10):
 
 
 @router.get("/citations/documents/{document_id}")
-async def get_document_citation(document_id: int):
+def get_document_citation(document_id: int):
     """Get citation information for a specific document."""
     try:
-        from utils.document_db import get_db_connection
-        
         with get_db_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute(
@@ -102,12 +109,9 @@ async def get_document_citation(document_id: int):
                 if not row:
                     raise HTTPException(status_code=404, detail="Document not found")
                 
-                columns = [desc[0] for desc in cursor.description]
-                document = dict(zip(columns, row))
-                
                 return {
                     "status": "success",
-                    "document": document
+                    "document": dict(row)
                 }
     except HTTPException:
         raise
@@ -1,4 +1,10 @@
-from fastapi import APIRouter, HTTPException, Request
+import itertools
+import json
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from models import FeedbackRequest
 from services import FeedbackService
 from utils import get_db_connection
@@ -16,18 +22,46 @@ async def save_feedback(feedback: FeedbackRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _stream_favorites(favorites, limit: Optional[int]):
+    """Yield the favorites response as a JSON document, one row at a time."""
+    yield '{"status": "success", "favorites": ['
+    separator = ""
+    count = 0
+    last = None
+    for favorite in favorites:
+        yield separator + json.dumps(favorite)
+        separator = ", "
+        count += 1
+        last = favorite
+    next_cursor = None
+    if limit and count == limit:
+        next_cursor = f"{last['favorited_at']}|{last['feedback_id']}"
+    yield f'], "next_cursor": {json.dumps(next_cursor)}}}'
+
 @router.get("/favorites")
-async def get_favorites():
-    """Get all favorite queries."""
+def get_favorites(
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Page size; all favorites when omitted"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    preview_chars: Optional[int] = Query(None, ge=1, description="Truncate answer_text to this many characters")
+):
+    """Get favorite queries, optionally one keyset-paginated page at a time."""
+    after = None
+    if cursor:
+        try:
+            favorited_at, feedback_id = cursor.rsplit("|", 1)
+            after = (datetime.fromisoformat(favorited_at), int(feedback_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    feedback_service = FeedbackService()
+    favorites = feedback_service.iter_favorites(limit=limit, after=after, preview_chars=preview_chars)
     try:
-        feedback_service = FeedbackService()
-        favorites = feedback_service.get_favorites()
-        return {
-            "status": "success",
-            "favorites": favorites
-        }
+        # Run the query before the response starts so failures still return a 500
+        first = list(itertools.islice(favorites, 1))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse(_stream_favorites(itertools.chain(first, favorites), limit),
+                             media_type="application/json")
 
 @router.get("/feedback/{memory_id}")
 async def get_feedback(memory_id: int):
@@ -50,53 +84,55 @@ async def delete_feedback(memory_id: int):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/evaluation/metrics")
-async def get_evaluation_metrics():
+def get_evaluation_metrics():
     """Get aggregated evaluation metrics from user feedback."""
     try:
         with get_db_connection() as conn:
             with conn.cursor() as cursor:
-                # Get rating distribution
-                cursor.execute("""
-                    SELECT 
-                        rating,
-                        COUNT(*) as count
-                    FROM user_feedback
-                    WHERE rating IS NOT NULL
-                    GROUP BY rating
-                    ORDER BY rating
-                """)
-                rating_distribution = cursor.fetchall()
-                
-                # Get overall statistics
-                cursor.execute("""
-                    SELECT 
-                        COUNT(*) as total_feedback,
-                        COUNT(CASE WHEN rating IS NOT NULL THEN 1 END) as rated_count,
-                        AVG(rating) as average_rating,
-                        COUNT(CASE WHEN accuracy_rating IS NOT NULL THEN 1 END) as accuracy_rated_count,
-                        AVG(accuracy_rating) as average_accuracy_rating,
-                        COUNT(CASE WHEN comprehensiveness_rating IS NOT NULL THEN 1 END) as comprehensiveness_rated_count,
-                        AVG(comprehensiveness_rating) as average_comprehensiveness_rating,
-                        COUNT(CASE WHEN helpfulness_rating IS NOT NULL THEN 1 END) as helpfulness_rated_count,
-                        AVG(helpfulness_rating) as average_helpfulness_rating,
-                        COUNT(CASE WHEN is_favorite = true THEN 1 END) as favorites_count,
-                        COUNT(CASE WHEN feedback_text IS NOT NULL THEN 1 END) as text_feedback_count
-                    FROM user_feedback
-                """)
-                stats = cursor.fetchone()
-                
-                # Get feedback by time
+                # Overall statistics, rating distribution and 30-day timeline
+                # in one round-trip; the base CTE is scanned once and shared.
                 cursor.execute("""
-                    SELECT 
-                        DATE(created_at) as date,
-                        COUNT(*) as feedback_count,
-                        AVG(rating) as avg_rating
-                    FROM user_feedback
-                    WHERE created_at >= CURRENT_DATE - INTERVAL '30 days'
-                    GROUP BY DATE(created_at)
-                    ORDER BY date
+                    WITH base AS (
+                        SELECT rating, accuracy_rating, comprehensiveness_rating, helpfulness_rating,
+                               is_favorite, feedback_text IS NOT NULL AS has_text, created_at
+                        FROM user_feedback
+                    )
+                    SELECT
+                        (SELECT row_to_json(o) FROM (
+                            SELECT 
+                                COUNT(*) as total_feedback,
+                                COUNT(CASE WHEN rating IS NOT NULL THEN 1 END) as rated_count,
+                                AVG(rating) as average_rating,
+                                COUNT(CASE WHEN accuracy_rating IS NOT NULL THEN 1 END) as accuracy_rated_count,
+                                AVG(accuracy_rating) as average_accuracy_rating,
+                                COUNT(CASE WHEN comprehensiveness_rating IS NOT NULL THEN 1 END) as comprehensiveness_rated_count,
+                                AVG(comprehensiveness_rating) as average_comprehensiveness_rating,
+                                COUNT(CASE WHEN helpfulness_rating IS NOT NULL THEN 1 END) as helpfulness_rated_count,
+                                AVG(helpfulness_rating) as average_helpfulness_rating,
+                                COUNT(CASE WHEN is_favorite = true THEN 1 END) as favorites_count,
+                                COUNT(CASE WHEN has_text THEN 1 END) as text_feedback_count
+                            FROM base
+                        ) o) AS overall,
+                        (SELECT COALESCE(json_agg(d ORDER BY d.rating), '[]'::json) FROM (
+                            SELECT rating, COUNT(*) as count
+                            FROM base
+                            WHERE rating IS NOT NULL
+                            GROUP BY rating
+                        ) d) AS rating_distribution,
+                        (SELECT COALESCE(json_agg(t ORDER BY t.date), '[]'::json) FROM (
+                            SELECT 
+                                DATE(created_at) as date,
+                                COUNT(*) as feedback_count,
+                                AVG(rating) as avg_rating
+                            FROM base
+                            WHERE created_at >= CURRENT_DATE - INTERVAL '30 days'
+                            GROUP BY DATE(created_at)
+                        ) t) AS timeline
                 """)
-                feedback_timeline = cursor.fetchall()
+                row = cursor.fetchone()
+                stats = row["overall"]
+                rating_distribution = row["rating_distribution"]
+                feedback_timeline = row["timeline"]
                 
                 return {
                     "status": "success",
@@ -120,7 +156,7 @@ async def get_evaluation_metrics():
                         ],
                         "timeline": [
                             {
-                                "date": t["date"].isoformat(),
+                                "date": t["date"],  # already ISO formatted by json_agg
                                 "feedback_count": t["feedback_count"],
                                 "average_rating": float(t["avg_rating"]) if t["avg_rating"] else None
                             }
@@ -4,30 +4,34 @@ from utils import get_db_connection
 router = APIRouter(prefix="/ingestion/quality", tags=["Ingestion Quality"])
 
 @router.get("/{document_id}")
-async def get_document_quality(document_id: int):
+def get_document_quality(document_id: int):
     try:
         with get_db_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute(
                     """
-                    SELECT 
-                        COUNT(*) FILTER (WHERE ce.score = 1) AS good_chunks,
-                        COUNT(*) AS total_chunks
-                    FROM chunk_evaluations ce
-                    JOIN document_chunks dc ON dc.id = ce.chunk_id
-                    WHERE (dc.source_metadata->>'content_hash') = (
-                        SELECT source_metadata->>'content_hash' 
+                    WITH target AS MATERIALIZED (
+                        SELECT source_metadata->>'content_hash' AS content_hash
                         FROM document_chunks 
                         WHERE id = %s
                         LIMIT 1
                     )
+                    SELECT 
+                        COUNT(*) FILTER (WHERE ce.score = 1) AS good_chunks,
+                        COUNT(*) AS total_chunks,
+                        COALESCE(ROUND(100.0 * COUNT(*) FILTER (WHERE ce.score = 1) / NULLIF(COUNT(*), 0), 1), 0)::float AS percentage
+                    FROM target t
+                    JOIN document_chunks dc ON (dc.source_metadata->>'content_hash') = t.content_hash
+                    JOIN chunk_evaluations ce ON ce.chunk_id = dc.id
                 """,
                     (document_id,)
                 )
                 row = cursor.fetchone()
-                good = row["good_chunks"] or 0
-                total = row["total_chunks"] or 0
-                pct = round((good / total) * 100, 1) if total else 0.0
+                chunk_quality = {
+                    "good": row["good_chunks"],
+                    "total": row["total_chunks"],
+                    "percentage": row["percentage"]
+                }
 
                 cursor.execute(
                     """
@@ -39,7 +43,7 @@ async def get_document_quality(document_id: int):
                 ocr_stats = cursor.fetchone()
                 return {
                     "document_id": document_id,
-                    "chunk_quality": {"good": good, "total": total, "percentage": pct},
+                    "chunk_quality": chunk_quality,
                     "ocr": {
                         "documents_with_ocr": ocr_stats["ocr_docs"] or 0,
                         "total_documents": ocr_stats["all_docs"] or 0
@@ -49,35 +53,41 @@ async def get_document_quality(document_id: int):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/summary")
-async def get_ingestion_quality_summary():
+def get_ingestion_quality_summary():
     try:
         with get_db_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute(
                     """
-                    SELECT 
-                        COUNT(*) FILTER (WHERE score = 1) AS good,
-                        COUNT(*) AS total
-                    FROM chunk_evaluations
-                """
-                )
-                row = cursor.fetchone()
-                good = row["good"] or 0
-                total = row["total"] or 0
-                pct = round((good / total) * 100, 1) if total else 0.0
-
-                cursor.execute(
-                    """
-                    SELECT 
-                        COUNT(DISTINCT source_metadata->>'source') as unique_documents,
-                        COUNT(*) as total_chunks
-                    FROM document_chunks
+                    SELECT ce.good, ce.total, ce.percentage, dc.unique_documents, dc.total_chunks
+                    FROM (
+                        SELECT 
+                            COUNT(*) FILTER (WHERE score = 1) AS good,
+                            COUNT(*) AS total,
+                            COALESCE(ROUND(100.0 * COUNT(*) FILTER (WHERE score = 1) / NULLIF(COUNT(*), 0), 1), 0)::float AS percentage
+                        FROM chunk_evaluations
+                    ) ce
+                    CROSS JOIN (
+                        SELECT 
+                            COUNT(DISTINCT source_metadata->>'source') as unique_documents,
+                            COUNT(*) as total_chunks
+                        FROM document_chunks
+                    ) dc
                     """
                 )
-                overall = cursor.fetchone()
+                row = cursor.fetchone()
+                chunk_quality = {
+                    "good": row["good"],
+                    "total": row["total"],
+                    "percentage": row["percentage"]
+                }
+                overall = {
+                    "unique_documents": row["unique_documents"],
+                    "total_chunks": row["total_chunks"]
+                }
 
                 return {
-                    "chunk_quality": {"good": good, "total": total, "percentage": pct},
+                    "chunk_quality": chunk_quality,
                     "overall": overall
                 }
     except Exception as e:
@@ -1,7 +1,6 @@
 """
 Legacy Query Routes - Simple querying without advanced features
 """
-import json
 import time
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
@@ -43,7 +42,7 @@ async def process_simple_query(query_data: LegacyQuery):
     
     try:
         # Create query embedding
-        query_embedding = query_service.create_embedding(query_data.query)
+        query_embedding = query_service.create_embedding_cached(query_data.query)
         
         # Check memory if enabled
         if Config.ENABLE_MEMORY and query_data.use_memory:
@@ -66,12 +65,7 @@ async def process_simple_query(query_data: LegacyQuery):
         # Extract references from chunks
         references = []
         for chunk in chunks:
-            # Handle source_metadata (jsonb column returns dict, not string)
-            if isinstance(chunk['source_metadata'], str):
-                metadata = json.loads(chunk['source_metadata'])
-            else:
-                metadata = chunk['source_metadata']
-            source = metadata.get('source', 'Unknown source')
+            source = chunk['source']
             if source not in references:
                 references.append(source)
         
@@ -97,8 +91,7 @@ async def process_simple_query(query_data: LegacyQuery):
                 {
                     "id": chunk["id"],
                     "text": chunk["text_content"],
-                    "source": (json.loads(chunk["source_metadata"]) if isinstance(chunk["source_metadata"], str) 
-                             else chunk["source_metadata"]).get("source", "Unknown source"),
+                    "source": chunk["source"],
                     "similarity": float(chunk["similarity"])
                 } for chunk in chunks
             ],
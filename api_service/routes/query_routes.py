@@ -1,12 +1,14 @@
 """
 Query Routes with advanced prompting strategies
 """
-import json
 import time
+import json
 import asyncio
 from fastapi import APIRouter, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from models import ChunkResponse, EntityResponse, CommunityResponse
 from services.qa_service import QAService, RetrievalEvaluator
 from services.query_service import QueryService
@@ -56,47 +58,94 @@ async def process_query(query_data: Query):
     - Answer verification
     - Security-aware prompting
     """
+    try:
+        return await _answer_query(query_data)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Query processing failed: {str(e)}")
+
+@router.post("/query/stream")
+async def stream_query(query_data: Query):
+    """
+    Same pipeline as /query, streamed as newline-delimited JSON: {"type": "token"}
+    events while the final answer is generated, then one {"type": "result"} event
+    with the full /query response (or {"type": "error"}).
+    """
+    token_queue: asyncio.Queue = asyncio.Queue()
+    
+    async def run():
+        try:
+            result = {"type": "result", "data": await _answer_query(query_data, token_queue)}
+        except Exception as e:
+            result = {"type": "error", "detail": f"Query processing failed: {str(e)}"}
+        await token_queue.put(result)
+    
+    async def events():
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                item = await token_queue.get()
+                if isinstance(item, str):
+                    yield json.dumps({"type": "token", "content": item}) + "\n"
+                    continue
+                yield json.dumps(jsonable_encoder(item)) + "\n"
+                break
+        finally:
+            if not task.done():
+                task.cancel()
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+async def _answer_query(query_data: Query, token_queue: Optional[asyncio.Queue] = None) -> Dict[str, Any]:
+    """Run the /query pipeline; answer tokens are also put on token_queue when given."""
     start_time = time.time()
     
-    try:
-        # Create query embedding
-        query_embedding = query_service.create_embedding(query_data.query)
-        
-        # Check memory if enabled
-        if Config.ENABLE_MEMORY and query_data.use_memory:
-            memory_result = memory_service.check_memory(query_data.query, query_embedding)
-            if memory_result:
-                # Add processing time and return cached result
-                memory_result["processing_time"] = time.time() - start_time
-                return memory_result
-        
-        # Perform vector search to get initial chunks
-        all_chunks = query_service.vector_search(query_embedding, query_data.max_results * 2)
-        
-        # Smart chunk selection using classification
-        if query_data.use_smart_selection and len(all_chunks) > query_data.max_results:
-            selected_chunks = await qa_service.smart_chunk_selection(
-                all_chunks, query_data.query, query_data.max_results
-            )
-        else:
-            selected_chunks = all_chunks[:query_data.max_results]
-        
-        # Load graph data and enhance results
-        entities, communities = graph_service.enhance_with_graph(selected_chunks)
-        
-        # Generate  answer with optional amplification
-        answer, subquestions_data, verification_score = await qa_service.answer_generation(
-            query_data.query, 
-            selected_chunks, 
-            use_amplification=query_data.use_amplification,
-            use_haiku_verification=query_data.use_haiku_verification
+    # Create query embedding
+    query_embedding = query_service.create_embedding_cached(query_data.query)
+
+    # Check memory if enabled
+    if Config.ENABLE_MEMORY and query_data.use_memory:
+        memory_result = memory_service.check_memory(query_data.query, query_embedding)
+        if memory_result:
+            # Add processing time and return cached result
+            memory_result["processing_time"] = time.time() - start_time
+            return memory_result
+
+    # Perform vector search to get initial chunks
+    all_chunks = await query_service.vector_search_async(query_embedding, query_data.max_results * 2)
+
+    # Smart chunk selection using classification
+    if query_data.use_smart_selection and len(all_chunks) > query_data.max_results:
+        selected_chunks = await qa_service.smart_chunk_selection(
+            all_chunks, query_data.query, query_data.max_results
         )
-        
+    else:
+        selected_chunks = all_chunks[:query_data.max_results]
+
+    # Load graph data and enhance results
+    entities, communities = graph_service.enhance_with_graph(selected_chunks)
+
+    # Generate  answer with optional amplification
+    context = qa_service.make_context(selected_chunks)
+    answer, subquestions_data = await qa_service.draft_answer(
+        query_data.query, 
+        context, 
+        use_amplification=query_data.use_amplification,
+        token_queue=token_queue
+    )
+
+    # Verification only needs the answer; let it run while references,
+    # memory and retrieval evaluations are written
+    verification_task = asyncio.create_task(qa_service.verify_answer(
+        query_data.query, answer, context, query_data.use_haiku_verification
+    ))
+
+    try:
         # Generate proper academic references using the query service
         references = await query_service.generate_academic_references(selected_chunks)
-        
+
         # Save to memory
-        memory_id = memory_service.save_to_memory(
+        memory_id = await asyncio.to_thread(
+            memory_service.save_to_memory,
             query_data.query, 
             query_embedding, 
             answer, 
@@ -105,7 +154,7 @@ async def process_query(query_data: Query):
             entities[:10] if entities else [], 
             communities[:5] if communities else []
         )
-        
+
         # Persist retrieval evaluations (vector-only for now)
         try:
             vector_eval = retrieval_evaluator.evaluate_vector_retrieval(query_data.query, max_results=query_data.max_results)
@@ -114,49 +163,54 @@ async def process_query(query_data: Query):
                 retrieval_evaluator.persist_retrieval_evaluations(memory_id, judgments)
             # Optionally run LLM-based retrieval judgments
             use_llm = query_data.use_llm_retrieval_eval if query_data.use_llm_retrieval_eval is not None else Config.USE_LLM_RETRIEVAL_EVAL_DEFAULT
-            if use_llm:
-                llm_judgments = await retrieval_evaluator.evaluate_llm_retrieval(query_data.query, all_chunks[:query_data.max_results])
-                if memory_id is not None and llm_judgments:
-                    retrieval_evaluator.persist_retrieval_evaluations(memory_id, llm_judgments)
+            if use_llm and memory_id is not None:
+                await retrieval_evaluator.evaluate_and_persist_llm_retrieval(
+                    memory_id, query_data.query, all_chunks[:query_data.max_results]
+                )
         except Exception as e:
             # Non-fatal, continue request
             print(f"Retrieval evaluation persistence error: {e}")
-        
-        # Calculate processing time
-        processing_time = time.time() - start_time
-        
-        # Format response
-        response = {
-            "query": query_data.query,
-            "answer": answer,
-            "chunks": [
-                {
-                    "id": chunk["id"],
-                    "text": chunk["text_content"],
-                    "source": (json.loads(chunk["source_metadata"]) if isinstance(chunk["source_metadata"], str) 
-                             else chunk["source_metadata"]).get("source", "Unknown source"),
-                    "similarity": float(chunk["similarity"])
-                } for chunk in selected_chunks
-            ],
-            "entities": entities[:10],
-            "communities": communities[:5],
-            "references": references,
-            "subquestions": [
-                {
-                    "question": sq["question"],
-                    "answer": sq["answer"]
-                } for sq in subquestions_data
-            ],
-            "verification_score": verification_score,
-            "from_memory": False,
-            "memory_id": memory_id if memory_id is not None else -1,
-            "processing_time": processing_time
-        }
-        
-        return response
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Query processing failed: {str(e)}")
+
+        verification_score = await verification_task
+    finally:
+        # Stop the verification call if a later step failed or the stream was
+        # cancelled; a finished but unawaited task has its error retrieved here
+        if not verification_task.done():
+            verification_task.cancel()
+        elif not verification_task.cancelled():
+            verification_task.exception()
+
+    # Calculate processing time
+    processing_time = time.time() - start_time
+
+    # Format response
+    response = {
+        "query": query_data.query,
+        "answer": answer,
+        "chunks": [
+            {
+                "id": chunk["id"],
+                "text": chunk["text_content"],
+                "source": chunk["source"],
+                "similarity": float(chunk["similarity"])
+            } for chunk in selected_chunks
+        ],
+        "entities": entities[:10],
+        "communities": communities[:5],
+        "references": references,
+        "subquestions": [
+            {
+                "question": sq["question"],
+                "answer": sq["answer"]
+            } for sq in subquestions_data
+        ],
+        "verification_score": verification_score,
+        "from_memory": False,
+        "memory_id": memory_id if memory_id is not None else -1,
+        "processing_time": processing_time
+    }
+
+    return response
 
 @router.post("/query/classify-chunks")
 async def classify_chunks(query: str, chunk_ids: List[int]):
@@ -213,7 +267,7 @@ async def generate_subquestions_endpoint(query: str, context: Optional[str] = No
     try:
         if not context:
             # Get some context from top chunks
-            query_embedding = query_service.create_embedding(query)
+            query_embedding = query_service.create_embedding_cached(query)
             chunks = query_service.vector_search(query_embedding, 3)
             context = "\n\n".join([chunk['text_content'] for chunk in chunks])
         
@@ -238,7 +292,7 @@ async def verify_answer_endpoint(query: str, answer: str, context: Optional[str]
     try:
         if not context:
             # Get some context from top chunks
-            query_embedding = query_service.create_embedding(query)
+            query_embedding = query_service.create_embedding_cached(query)
             chunks = query_service.vector_search(query_embedding, 5)
             context = "\n\n".join([chunk['text_content'] for chunk in chunks])
         
@@ -1,68 +1,92 @@
+import itertools
+import json
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from utils import get_db_connection
 
 router = APIRouter(prefix="/retrieval/eval", tags=["Retrieval Eval"])
 
+# How long the retrieval_eval_summary materialized view may be served before refreshing
+SUMMARY_MAX_AGE_SECONDS = 60
+
 @router.get("/summary")
-async def get_retrieval_eval_summary():
+def get_retrieval_eval_summary():
     try:
         with get_db_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute(
-                    """
+                summary_query = """
                     SELECT 
-                        COUNT(*) FILTER (WHERE relevance_score = 1) AS relevant,
-                        COUNT(*) AS total
-                    FROM retrieval_evaluations
-                    """
-                )
+                        relevant,
+                        total,
+                        p5,
+                        p10,
+                        refreshed_at < NOW() - make_interval(secs => %s) AS stale
+                    FROM retrieval_eval_summary
+                """
+                cursor.execute(summary_query, (SUMMARY_MAX_AGE_SECONDS,))
                 row = cursor.fetchone()
+                if row is None or row["stale"]:
+                    # Only one request refreshes at a time; the others serve the
+                    # stale row instead of queueing on the view's lock. The lock
+                    # is released when this transaction commits.
+                    cursor.execute(
+                        "SELECT pg_try_advisory_xact_lock(hashtext(%s)) AS locked",
+                        ("retrieval_eval_summary",)
+                    )
+                    if cursor.fetchone()["locked"]:
+                        cursor.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY retrieval_eval_summary")
+                        cursor.execute(summary_query, (SUMMARY_MAX_AGE_SECONDS,))
+                        row = cursor.fetchone()
+
                 relevant = row["relevant"] or 0
                 total = row["total"] or 0
                 precision = round(relevant / total, 3) if total else 0.0
-
-                cursor.execute(
-                    """
-                    SELECT 
-                        AVG(CASE WHEN rank_position <= 5 THEN relevance_score END)::float AS p5,
-                        AVG(CASE WHEN rank_position <= 10 THEN relevance_score END)::float AS p10
-                    FROM retrieval_evaluations
-                    """
-                )
-                row2 = cursor.fetchone()
                 return {
                     "overall_precision": precision,
-                    "precision@5": float(row2["p5"]) if row2["p5"] is not None else 0.0,
-                    "precision@10": float(row2["p10"]) if row2["p10"] is not None else 0.0,
+                    "precision@5": float(row["p5"]) if row["p5"] is not None else 0.0,
+                    "precision@10": float(row["p10"]) if row["p10"] is not None else 0.0,
                     "total_judgments": total,
                 }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Rows fetched per round-trip by the server-side cursor when streaming judgments
+JUDGMENT_STREAM_BATCH_SIZE = 500
+
+def _stream_query_judgments(query_id: int):
+    """Yield the query's judgments as a JSON document, one batch of rows at a time."""
+    with get_db_connection() as conn:
+        # Named cursor => server-side; rows (with full chunk text) are pulled in batches
+        with conn.cursor(name="ret_eval_stream") as cursor:
+            cursor.itersize = JUDGMENT_STREAM_BATCH_SIZE
+            cursor.execute(
+                """
+                SELECT 
+                    re.chunk_id,
+                    re.relevance_score,
+                    re.rank_position,
+                    re.retrieval_method,
+                    dc.text_content
+                FROM retrieval_evaluations re
+                JOIN document_chunks dc ON dc.id = re.chunk_id
+                WHERE re.query_id = %s
+                ORDER BY re.rank_position ASC
+                """,
+                (query_id,)
+            )
+            yield f'{{"query_id": {json.dumps(query_id)}, "judgments": ['
+            separator = ""
+            for row in cursor:
+                yield separator + json.dumps(row)
+                separator = ", "
+            yield "]}"
+
 @router.get("/query/{query_id}")
-async def get_query_retrieval_eval(query_id: int):
+def get_query_retrieval_eval(query_id: int):
+    stream = _stream_query_judgments(query_id)
     try:
-        with get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(
-                    """
-                    SELECT 
-                        re.chunk_id,
-                        re.relevance_score,
-                        re.rank_position,
-                        re.retrieval_method,
-                        dc.text_content
-                    FROM retrieval_evaluations re
-                    JOIN document_chunks dc ON dc.id = re.chunk_id
-                    WHERE re.query_id = %s
-                    ORDER BY re.rank_position ASC
-                    """,
-                    (query_id,)
-                )
-                rows = cursor.fetchall()
-                return {
-                    "query_id": query_id,
-                    "judgments": rows
-                }
+        # Run the query before the response starts so failures still return a 500
+        head = next(stream)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse(itertools.chain([head], stream), media_type="application/json")
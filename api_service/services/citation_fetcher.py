@@ -4,14 +4,17 @@ Background service for fetching and updating document citations.
 
 import asyncio
 import logging
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime
 
 from .citation_service import CitationService, CitationMetadata
 from utils.document_db import (
-    get_documents_without_citations,
-    update_document_citation_metadata,
-    mark_citation_fetch_failed
+    claim_documents_for_citation,
+    store_citation_results,
+    open_listen_connection,
+    document_trigger_exists,
+    try_advisory_lock,
+    release_advisory_lock
 )
 
 logger = logging.getLogger(__name__)
@@ -20,113 +23,139 @@ logger = logging.getLogger(__name__)
 class CitationFetcher:
     """Background service to fetch citations for documents with DOIs."""
     
-    def __init__(self, batch_size: int = 10, delay_between_batches: float = 1.0):
+    # NOTIFY channel raised by the document insert trigger
+    NOTIFY_CHANNEL = "citation_pending"
+    NOTIFY_TRIGGER = "notify_citation_pending"
+    
+    def __init__(self, batch_size: int = 10, delay_between_batches: float = 1.0,
+                 max_concurrent_requests: int = 5, idle_timeout: float = 300.0):
         self.batch_size = batch_size
         self.delay_between_batches = delay_between_batches
+        self.max_concurrent_requests = max_concurrent_requests
+        # Fallback wake-up while idle, so time-based retries are still picked up
+        self.idle_timeout = idle_timeout
         self.is_running = False
-    
-    async def _update_document_doi(self, document_id: int, doi: str) -> bool:
-        """Update document table with extracted DOI."""
-        try:
-            from utils.document_db import get_db_connection
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
-                        "UPDATE document SET doi = %s, updated_at = NOW() WHERE id = %s",
-                        (doi, document_id)
-                    )
-                    conn.commit()
-                    return cursor.rowcount > 0
-        except Exception as e:
-            logger.error(f"Error updating DOI for document {document_id}: {e}")
-            return False
-    
-    async def _update_document_reference(self, document_id: int, citation: str) -> bool:
-        """Update document table with formatted citation."""
-        try:
-            from utils.document_db import get_db_connection
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
-                        """
-                        UPDATE document SET 
-                            reference = %s,
-                            citation_fetched = TRUE,
-                            citation_fetch_attempted_at = NOW(),
-                            citation_fetch_error = NULL,
-                            updated_at = NOW()
-                        WHERE id = %s
-                        """,
-                        (citation, document_id)
-                    )
-                    conn.commit()
-                    return cursor.rowcount > 0
-        except Exception as e:
-            logger.error(f"Error updating citation for document {document_id}: {e}")
-            return False
+        self.last_claimed = 0
+        self._listen_conn = None
+        # Whether the insert trigger exists; without it nothing ever notifies
+        self._notify_available = False
     
     async def fetch_citations_batch(self) -> int:
         """Fetch citations for a batch of documents. Returns number processed."""
-        documents = get_documents_without_citations(self.batch_size)
+        documents = claim_documents_for_citation(self.batch_size)
+        self.last_claimed = len(documents)
         if not documents:
             return 0
         
-        processed_count = 0
+        doi_updates: List[Tuple[int, str]] = []
+        reference_updates: List[Tuple[int, Optional[str], Optional[str]]] = []
         
-        async with CitationService() as citation_service:
+        async with CitationService(defer_cache_writes=True) as citation_service:
+            targets: List[Tuple[int, str]] = []
             for doc in documents:
-                doc_id = doc['id']
-                filename = doc['filename']
-                doi = doc['doi']
-                
+                doc_id, filename, doi = doc['id'], doc['filename'], doc['doi']
                 logger.info(f"Processing document {doc_id}: {filename}")
                 
-                try:
-                    # Extract DOI if not already present
+                # Extract DOI if not already present
+                if not doi:
+                    doi = citation_service.extract_doi_from_filename(filename)
                     if not doi:
-                        doi = citation_service.extract_doi_from_filename(filename)
-                        if not doi:
-                            logger.info(f"No DOI found for {filename}, skipping")
-                            mark_citation_fetch_failed(doc_id, "No DOI found")
-                            continue
-                        else:
-                            # Update document table with extracted DOI
-                            logger.info(f"Extracted DOI {doi} from filename {filename}")
-                            await self._update_document_doi(doc_id, doi)
+                        logger.info(f"No DOI found for {filename}, skipping")
+                        reference_updates.append((doc_id, None, "No DOI found"))
+                        continue
                     
-                    # Fetch citation using DOI (returns formatted APA citation)
-                    citation = await citation_service.fetch_citation_from_doi(doi)
-                    
-                    if citation:
-                        # Update database with formatted citation
-                        success = await self._update_document_reference(doc_id, citation)
-                        
-                        if success:
-                            logger.info(f"Successfully updated citation for {filename}")
-                            processed_count += 1
-                        else:
-                            logger.error(f"Failed to update database for {filename}")
-                            mark_citation_fetch_failed(doc_id, "Database update failed")
-                    else:
-                        logger.warning(f"No citation found for DOI {doi} (file: {filename})")
-                        mark_citation_fetch_failed(doc_id, f"No citation found for DOI {doi}")
-                
-                except Exception as e:
-                    logger.error(f"Error processing document {filename}: {e}")
-                    mark_citation_fetch_failed(doc_id, str(e))
-                
-                # Small delay between documents to be respectful to APIs
-                await asyncio.sleep(0.5)
+                    logger.info(f"Extracted DOI {doi} from filename {filename}")
+                    doi_updates.append((doc_id, doi))
+                targets.append((doc_id, doi))
+            
+            # One concurrent, rate-limited lookup for the whole batch
+            citations = await citation_service.fetch_citations_bulk(
+                [doi for _, doi in targets], concurrency=self.max_concurrent_requests
+            )
+        cache_entries = list(citation_service.pending_cache_writes.items())
+        
+        for doc_id, doi in targets:
+            citation = citations.get(CitationService.normalize_doi(doi))
+            if citation:
+                reference_updates.append((doc_id, citation, None))
+            else:
+                logger.warning(f"No citation found for DOI {doi} (document {doc_id})")
+                reference_updates.append((doc_id, None, f"No citation found for DOI {doi}"))
+        
+        if not store_citation_results(doi_updates, reference_updates, cache_entries):
+            logger.error(f"Failed to store citation results for {len(reference_updates)} documents")
+            return 0
         
+        processed_count = sum(1 for _, citation, _ in reference_updates if citation)
+        logger.info(f"Stored citations for {processed_count}/{len(documents)} documents")
         return processed_count
     
+    async def _wait_for_pending(self):
+        """Block until a citation_pending notification arrives or idle_timeout passes."""
+        if not self._notify_available:
+            await asyncio.sleep(self.delay_between_batches)
+            return
+        
+        if self._listen_conn is None:
+            try:
+                self._listen_conn = open_listen_connection(self.NOTIFY_CHANNEL)
+            except Exception as e:
+                logger.warning(f"Could not LISTEN on {self.NOTIFY_CHANNEL}, polling instead: {e}")
+                await asyncio.sleep(self.delay_between_batches)
+                return
+        
+        conn = self._listen_conn
+        try:
+            # Notifications received while we were busy are already buffered
+            conn.poll()
+            if not conn.notifies:
+                loop = asyncio.get_running_loop()
+                readable = asyncio.Event()
+                loop.add_reader(conn.fileno(), readable.set)
+                try:
+                    await asyncio.wait_for(readable.wait(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    pass
+                finally:
+                    loop.remove_reader(conn.fileno())
+                conn.poll()
+            conn.notifies.clear()
+        except Exception as e:
+            logger.warning(f"Lost LISTEN connection, reconnecting: {e}")
+            self._close_listen_connection()
+            await asyncio.sleep(self.delay_between_batches)
+    
+    def _close_listen_connection(self):
+        if self._listen_conn is not None:
+            try:
+                self._listen_conn.close()
+            except Exception:
+                pass
+            self._listen_conn = None
+    
     async def run_continuous(self, max_iterations: int = None):
-        """Run the citation fetcher continuously."""
+        """Run the citation fetcher continuously.
+        
+        Batches are processed back to back while the queue is full; once it
+        drains, the fetcher sleeps until a new document is inserted (LISTEN
+        citation_pending) or idle_timeout elapses.
+        """
         self.is_running = True
         iteration = 0
         
         logger.info("Starting citation fetcher service")
         
+        try:
+            self._notify_available = document_trigger_exists(self.NOTIFY_TRIGGER)
+        except Exception as e:
+            logger.warning(f"Could not check for the {self.NOTIFY_TRIGGER} trigger: {e}")
+            self._notify_available = False
+        if not self._notify_available:
+            logger.warning(
+                f"Trigger {self.NOTIFY_TRIGGER} is not installed (db/add_citation_notify_trigger.sql); "
+                f"polling every {self.delay_between_batches}s instead of waiting for notifications"
+            )
+        
         try:
             while self.is_running:
                 if max_iterations and iteration >= max_iterations:
@@ -141,7 +170,10 @@ class CitationFetcher:
                         logger.debug(f"No documents to process in iteration {iteration + 1}")
                     
                     # Wait before next batch
-                    await asyncio.sleep(self.delay_between_batches)
+                    if self.last_claimed < self.batch_size:
+                        await self._wait_for_pending()
+                    else:
+                        await asyncio.sleep(self.delay_between_batches)
                     iteration += 1
                     
                 except Exception as e:
@@ -154,6 +186,7 @@ class CitationFetcher:
             logger.error(f"Fatal error in citation fetcher: {e}")
         finally:
             self.is_running = False
+            self._close_listen_connection()
             logger.info("Citation fetcher service stopped")
     
     def stop(self):
@@ -161,12 +194,27 @@ class CitationFetcher:
         self.is_running = False
 
 
+# Advisory lock making manual one-off runs singletons across API workers
+FETCH_ONCE_LOCK = "citation_fetcher"
+
+
 async def run_citation_fetcher_once():
-    """Run citation fetcher once (useful for testing or manual runs)."""
-    fetcher = CitationFetcher()
-    processed = await fetcher.fetch_citations_batch()
-    logger.info(f"Citation fetch completed: {processed} documents processed")
-    return processed
+    """Run citation fetcher once (useful for testing or manual runs).
+    
+    Returns None without fetching if another run already holds the lock.
+    """
+    lock_conn = try_advisory_lock(FETCH_ONCE_LOCK)
+    if lock_conn is None:
+        logger.info("Citation fetch already running elsewhere, skipping")
+        return None
+    
+    try:
+        fetcher = CitationFetcher()
+        processed = await fetcher.fetch_citations_batch()
+        logger.info(f"Citation fetch completed: {processed} documents processed")
+        return processed
+    finally:
+        release_advisory_lock(lock_conn, FETCH_ONCE_LOCK)
 
 
 if __name__ == "__main__":
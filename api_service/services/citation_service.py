@@ -9,16 +9,100 @@ Provides functionality to:
 """
 
 import re
+import sys
 import json
 import asyncio
 import aiohttp
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, List, Optional, Any, Tuple, Union
 from dataclasses import dataclass, asdict
 from datetime import datetime, timedelta
 import logging
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    # Linear-time DFA matching for the patterns that scan whole documents
+    import re2 as _text_re
+    RE2_AVAILABLE = True
+except ImportError:
+    _text_re = re
+    RE2_AVAILABLE = False
+
+from utils.document_db import get_cached_citation, get_cached_citations, save_cached_citation
+from utils.ttl_cache import TTLCache
+
 logger = logging.getLogger(__name__)
 
+async def _read_json(response: aiohttp.ClientResponse) -> Any:
+    """Decode a JSON response body, using orjson when it is installed."""
+    body = await response.read()
+    return orjson.loads(body) if ORJSON_AVAILABLE else json.loads(body)
+
+# Process-wide HTTP session so DOI lookups reuse pooled keep-alive connections
+# (one TLS handshake per host instead of per CitationService)
+_SESSION: Optional[aiohttp.ClientSession] = None
+_SESSION_LOOP: Optional[asyncio.AbstractEventLoop] = None
+
+
+async def get_session() -> aiohttp.ClientSession:
+    """Return the shared citation HTTP session, creating it on first use."""
+    global _SESSION, _SESSION_LOOP
+    loop = asyncio.get_running_loop()
+    # Creation never awaits, so no lock is needed within one event loop; a new
+    # loop (e.g. a script calling asyncio.run) gets its own session.
+    if _SESSION is None or _SESSION.closed or _SESSION_LOOP is not loop:
+        connector = aiohttp.TCPConnector(limit=64, limit_per_host=16,
+                                         ttl_dns_cache=300, keepalive_timeout=60)
+        _SESSION = aiohttp.ClientSession(connector=connector)
+        _SESSION_LOOP = loop
+    return _SESSION
+
+
+async def close_session():
+    """Close the shared citation HTTP session (call on application shutdown)."""
+    global _SESSION, _SESSION_LOOP
+    if _SESSION is not None and not _SESSION.closed:
+        await _SESSION.close()
+    _SESSION = None
+    _SESSION_LOOP = None
+
+
+# Citations by normalized DOI, shared by every CitationService in the process
+_CITATION_CACHE = TTLCache(maxsize=10_000, ttl=24 * 3600)
+# DOIs the citation API could not resolve, so repeats skip the network for a while
+_NEGATIVE_CACHE = TTLCache(maxsize=10_000, ttl=3600)
+# Registration agency per DOI ('crossref' or 'other'); non-Crossref DOIs skip Crossref calls
+_AGENCY_CACHE = TTLCache(maxsize=50_000, ttl=7 * 24 * 3600)
+
+# DOI in free text, with or without a "doi:" prefix; one scan instead of one per variant
+_DOI_RE = _text_re.compile(r'(?i)(?:doi:\s*)?(10\.\d{4,}\S*)')
+_TRAIL_RE = re.compile(r'[.,;:\s]+$')
+# DOI or four-digit year, so front matter is scanned once for both
+_DOI_YEAR_RE = _text_re.compile(r'(?i)(?:doi:\s*)?(?P<doi>10\.\d{4,}\S*)|(?P<year>\b(?:19|20)\d{2}\b)')
+_EXT_RE = re.compile(r'\.(?:pdf|docx?|txt)$', re.IGNORECASE)
+
+def _scan_doi_and_year(text: str, endpos: int, want_doi: bool) -> Tuple[Optional[str], Optional[int]]:
+    """Find the first DOI and the most recent plausible year in text[:endpos]."""
+    current_year = datetime.now().year
+    doi, best_year = None, None
+    for match in _DOI_YEAR_RE.finditer(text, 0, endpos):
+        found_doi = match.group('doi')
+        if found_doi is not None:
+            if want_doi and doi is None:
+                doi = _TRAIL_RE.sub('', found_doi)
+        else:
+            year = int(match.group('year'))
+            if year <= current_year and (best_year is None or year > best_year):
+                best_year = year
+        # Nothing later can improve on the current year
+        if best_year == current_year and (doi or not want_doi):
+            break
+    return doi, best_year
+
 @dataclass
 class CitationMetadata:
     """Structured citation metadata."""
@@ -45,62 +129,64 @@ class CitationService:
     
     # DOI API endpoints
     CROSSREF_API = "https://api.crossref.org/works/"
+    CROSSREF_WORKS_API = "https://api.crossref.org/works"
     DATACITE_API = "https://api.datacite.org/dois/"
     
-    # Common DOI patterns
-    DOI_PATTERNS = [
-        r'10\.\d{4,}[^\s]*',  # Standard DOI format
-        r'doi:\s*10\.\d{4,}[^\s]*',  # DOI with prefix
-        r'DOI:\s*10\.\d{4,}[^\s]*',  # DOI with uppercase prefix
-    ]
+    # Back-off applied when the citation API answers 429 without Retry-After
+    DEFAULT_RATE_LIMIT_DELAY = 1.0
+    MAX_RATE_LIMIT_RETRIES = 2
+    
+    # Leading slice of a document searched first for metadata such as the year
+    FRONT_MATTER_CHARS = 8192
+    
+    # DOIs per Crossref /works?filter=doi:... request (keeps the URL well under limits)
+    CROSSREF_BULK_SIZE = 100
+    # Only the fields _format_apa_from_crossref reads; full records carry abstracts and references
+    CROSSREF_SELECT = ("DOI,title,author,container-title,published-print,published-online,"
+                       "issued,volume,issue,page,publisher,URL")
     
-    def __init__(self):
-        self.session = None
-        self._citation_cache = {}  # Simple in-memory cache
+    def __init__(self, defer_cache_writes: bool = False):
+        self._rate_limited_until = 0.0  # Event-loop time until which requests should wait
+        # When deferring, new citation_cache rows are queued here for the caller
+        # to write together with its own batch instead of one commit per DOI
+        self.defer_cache_writes = defer_cache_writes
+        self.pending_cache_writes: Dict[str, str] = {}
         
     async def __aenter__(self):
-        """Async context manager entry."""
-        self.session = aiohttp.ClientSession()
+        """Async context manager entry; the HTTP session is shared, see get_session()."""
         return self
         
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Async context manager exit."""
-        if self.session:
-            await self.session.close()
+        pass
     
     def extract_doi_from_filename(self, filename: str) -> Optional[str]:
         """Extract DOI from filename by converting first hyphen to forward slash."""
         if not filename:
             return None
         
-        # Remove file extension and path
-        import os
-        base_name = os.path.splitext(os.path.basename(filename))[0]
+        # Remove path and file extension
+        base = filename.rpartition('/')[2].rpartition('\\')[2]
+        base = base.rpartition('.')[0] or base
         
-        # Check if filename looks like a DOI (starts with 10. and has hyphens)
-        if base_name.startswith('10.') and '-' in base_name:
-            # Convert first hyphen to forward slash to create DOI
-            doi = base_name.replace('-', '/', 1)
-            # Validate DOI format
-            import re
-            if re.match(r'^10\.\d{4,}/', doi):
-                return doi
-        
-        return None
+        # Filename must look like a DOI ("10." + registrant digits) with a hyphen for the slash
+        if not base.startswith('10.'):
+            return None
+        prefix, sep, suffix = base.partition('-')
+        if not sep or len(prefix) < 7 or not prefix[3:].isdigit():
+            return None
+        return f"{prefix}/{suffix}"
 
     def extract_doi_from_text(self, text: str) -> Optional[str]:
         """Extract DOI from text content."""
-        if not text:
+        # Plain substring scan is much cheaper than the regex on DOI-free text
+        if not text or '10.' not in text:
             return None
             
-        for pattern in self.DOI_PATTERNS:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            if matches:
-                # Clean up the DOI
-                doi = matches[0].replace('doi:', '').replace('DOI:', '').strip()
-                # Remove common trailing punctuation
-                doi = re.sub(r'[.,;:\s]+$', '', doi)
-                return doi
+        match = _DOI_RE.search(text)
+        if match:
+            # Remove common trailing punctuation
+            return _TRAIL_RE.sub('', match.group(1))
         return None
     
     def extract_basic_metadata_from_text(self, text: str, filename: str = None) -> CitationMetadata:
@@ -109,77 +195,321 @@ class CitationService:
         
         # Try to extract DOI - prioritize filename-based DOI for this archive
         metadata.doi = self.extract_doi_from_filename(filename)
+        
+        # One pass over the front matter yields both the DOI and the year
+        doi, metadata.year = _scan_doi_and_year(text, self.FRONT_MATTER_CHARS, want_doi=not metadata.doi)
         if not metadata.doi:
-            metadata.doi = self.extract_doi_from_text(text)
+            metadata.doi = doi or self.extract_doi_from_text(text)
+        if metadata.year is None and len(text) > self.FRONT_MATTER_CHARS:
+            _, metadata.year = _scan_doi_and_year(text, len(text), want_doi=False)
         
         # Try to extract title (first non-empty line or largest font text)
-        lines = text.split('\n')
+        lines = text.split('\n', 20)
         for line in lines[:20]:  # Check first 20 lines
             clean_line = line.strip()
             if clean_line and len(clean_line) > 20:  # Potential title
                 metadata.title = clean_line
                 break
         
-        # Try to extract year
-        year_matches = re.findall(r'\b(19|20)\d{2}\b', text)
-        if year_matches:
-            years = [int(y) for y in year_matches if 1900 <= int(y) <= datetime.now().year]
-            if years:
-                metadata.year = max(years)  # Use the most recent year found
-        
         # Use filename as fallback title if no title found
         if not metadata.title and filename:
             # Clean filename to make it more readable
             title = filename.replace('_', ' ').replace('-', ' ')
-            title = re.sub(r'\.(pdf|docx?|txt)$', '', title, re.IGNORECASE)
+            title = _EXT_RE.sub('', title)
             metadata.title = title.title()
             
         return metadata
     
+    @staticmethod
+    def normalize_doi(doi: str) -> str:
+        """Canonicalize a DOI for cache keys (DOIs are case-insensitive)."""
+        doi = doi.strip().lower()
+        for prefix in ('https://doi.org/', 'http://doi.org/', 'https://dx.doi.org/',
+                       'http://dx.doi.org/', 'doi:'):
+            if doi.startswith(prefix):
+                doi = doi[len(prefix):].strip()
+                break
+        return doi
+    
     async def fetch_citation_from_doi(self, doi: str) -> Optional[str]:
-        """Fetch APA-formatted citation from doi.org citation API."""
-        if not doi or not self.session:
+        """Fetch APA-formatted citation for a DOI, consulting the caches first."""
+        if not doi:
             return None
+        
+        key = self.normalize_doi(doi)
             
-        # Check cache first
-        if doi in self._citation_cache:
-            cached_citation, timestamp = self._citation_cache[doi]
-            # Cache for 24 hours
-            if datetime.now() - timestamp < timedelta(hours=24):
-                return cached_citation
+        # Check in-memory cache first
+        cached_citation = _CITATION_CACHE.get(key)
+        if cached_citation:
+            return cached_citation
+        if _NEGATIVE_CACHE.get(key):
+            return None
         
-        # Clean DOI
-        clean_doi = doi.strip().replace('https://doi.org/', '')
+        # Then the persistent cache shared with other fetchers
+        try:
+            cached_citation = get_cached_citation(key)
+        except Exception as e:
+            logger.warning(f"Citation cache lookup failed for DOI {key}: {e}")
+            cached_citation = None
         
+        if cached_citation:
+            _CITATION_CACHE.set(key, cached_citation)
+            return cached_citation
+        
+        return await self._fetch_and_store(key)
+    
+    async def _fetch_and_store(self, key: str) -> Optional[str]:
+        """Fetch a citation for a normalized DOI from the API and cache it."""
+        citation = await self._fetch_citation_from_api(key)
+        if citation:
+            self._store_citation(key, citation)
+        return citation
+    
+    def _store_citation(self, key: str, citation: str):
+        """Remember a fetched citation in memory and in the persistent cache."""
+        _CITATION_CACHE.set(key, citation)
+        if self.defer_cache_writes:
+            self.pending_cache_writes[key] = citation
+            return
+        try:
+            save_cached_citation(key, citation)
+        except Exception as e:
+            logger.warning(f"Could not persist citation for DOI {key}: {e}")
+    
+    async def _fetch_citation_from_api(self, doi: str) -> Optional[str]:
+        """Fetch APA-formatted citation from doi.org citation API."""
         try:
             # Use doi.org citation API for APA format
-            url = f"https://citation.doi.org/format?doi={clean_doi}&style=apa&lang=en-US"
+            url = f"https://citation.doi.org/format?doi={doi}&style=apa&lang=en-US"
             headers = {'Accept': 'text/plain'}
             
-            async with self.session.get(url, headers=headers, timeout=10) as response:
-                if response.status == 200:
-                    citation = await response.text()
-                    citation = citation.strip()
+            for _ in range(self.MAX_RATE_LIMIT_RETRIES + 1):
+                await self._wait_for_rate_limit()
+                session = await get_session()
+                
+                async with session.get(url, headers=headers, timeout=10) as response:
+                    if response.status == 429:
+                        self._register_rate_limit(response.headers.get('Retry-After'))
+                        continue
                     
-                    if citation and not citation.startswith('DOI not found'):
-                        # Cache the result
-                        self._citation_cache[doi] = (citation, datetime.now())
-                        return citation
+                    if response.status == 200:
+                        citation = await response.text()
+                        citation = citation.strip()
+                        
+                        if citation and not citation.startswith('DOI not found'):
+                            return citation
+                        _NEGATIVE_CACHE.set(doi, True)
+                    elif response.status == 404:
+                        _NEGATIVE_CACHE.set(doi, True)
+                    break
                         
         except Exception as e:
             logger.warning(f"Error fetching citation for DOI {doi}: {e}")
             
         return None
     
+    async def fetch_citations_bulk(self, dois: List[str], concurrency: int = 8) -> Dict[str, str]:
+        """Resolve many DOIs at once, keyed by normalized DOI.
+        
+        Cached DOIs are read in one query and the rest are looked up through
+        Crossref's bulk filter endpoint, CROSSREF_BULK_SIZE per request. Anything
+        Crossref does not return goes through the single-DOI lookup, at most
+        `concurrency` requests at a time. DOIs without a citation are absent
+        from the result.
+        """
+        if not dois:
+            return {}
+        
+        keys = list(dict.fromkeys(self.normalize_doi(doi) for doi in dois if doi))
+        found: Dict[str, str] = {}
+        
+        missing = []
+        for key in keys:
+            cached = _CITATION_CACHE.get(key)
+            if cached:
+                found[key] = cached
+            elif not _NEGATIVE_CACHE.get(key):
+                missing.append(key)
+        
+        if missing:
+            try:
+                persisted = get_cached_citations(missing)
+            except Exception as e:
+                logger.warning(f"Bulk citation cache lookup failed: {e}")
+                persisted = {}
+            for key, citation in persisted.items():
+                _CITATION_CACHE.set(key, citation)
+                found[key] = citation
+            missing = [key for key in missing if key not in persisted]
+        
+        # Commas separate filter values, so such DOIs can only go one at a time;
+        # DOIs known to be registered elsewhere are not worth a Crossref query
+        bulk_keys = [key for key in missing
+                     if ',' not in key and _AGENCY_CACHE.get(key) != 'other']
+        for i in range(0, len(bulk_keys), self.CROSSREF_BULK_SIZE):
+            chunk = bulk_keys[i:i + self.CROSSREF_BULK_SIZE]
+            fetched = await self._fetch_crossref_bulk(chunk)
+            if fetched is None:
+                continue
+            for key in chunk:
+                _AGENCY_CACHE.set(key, 'crossref' if key in fetched else 'other')
+            for key, citation in fetched.items():
+                self._store_citation(key, citation)
+                found[key] = citation
+        
+        leftovers = [key for key in missing if key not in found]
+        if leftovers:
+            semaphore = asyncio.Semaphore(concurrency)
+            
+            async def fetch_one(key: str) -> Optional[str]:
+                async with semaphore:
+                    return await self._fetch_and_store(key)
+            
+            results = await asyncio.gather(*(fetch_one(key) for key in leftovers),
+                                           return_exceptions=True)
+            for key, result in zip(leftovers, results):
+                if isinstance(result, Exception):
+                    logger.warning(f"Error fetching citation for DOI {key}: {result}")
+                elif result:
+                    found[key] = result
+        
+        return found
+    
+    async def _fetch_crossref_bulk(self, dois: List[str]) -> Optional[Dict[str, str]]:
+        """Fetch APA citations for up to CROSSREF_BULK_SIZE normalized DOIs in one request.
+        
+        Returns None if the request itself failed, as opposed to DOIs Crossref
+        simply does not know.
+        """
+        params = {
+            'filter': ','.join(f"doi:{doi}" for doi in dois),
+            'rows': str(len(dois)),
+            'select': self.CROSSREF_SELECT,
+        }
+        headers = {'Accept': 'application/json'}
+        wanted = set(dois)
+        
+        try:
+            for _ in range(self.MAX_RATE_LIMIT_RETRIES + 1):
+                await self._wait_for_rate_limit()
+                session = await get_session()
+                
+                async with session.get(self.CROSSREF_WORKS_API, params=params,
+                                       headers=headers, timeout=30) as response:
+                    if response.status == 429:
+                        self._register_rate_limit(response.headers.get('Retry-After'))
+                        continue
+                    
+                    if response.status != 200:
+                        logger.warning(f"CrossRef bulk lookup returned HTTP {response.status}")
+                        break
+                    
+                    data = await _read_json(response)
+                    citations = {}
+                    for work in data.get('message', {}).get('items', []):
+                        key = self.normalize_doi(work.get('DOI', ''))
+                        if key in wanted:
+                            citation = self._format_apa_from_crossref(work)
+                            if citation:
+                                citations[key] = citation
+                    return citations
+                    
+        except Exception as e:
+            logger.warning(f"CrossRef bulk lookup failed for {len(dois)} DOIs: {e}")
+        
+        return None
+    
+    @staticmethod
+    def _format_apa_from_crossref(work: Dict[str, Any]) -> Optional[str]:
+        """Render a Crossref work record as a plain-text APA reference.
+        
+        Mirrors the doi.org APA output (surname, initials; no markup) so bulk and
+        single-DOI lookups produce the same kind of string.
+        """
+        title = work.get('title', [None])[0] if work.get('title') else None
+        doi = work.get('DOI')
+        if not title or not doi:
+            return None
+        
+        names = []
+        for author in work.get('author', []):
+            family = author.get('family')
+            if family:
+                given = author.get('given', '').replace('-', ' ').split()
+                initials = ' '.join(f"{part[0]}." for part in given)
+                names.append(f"{family}, {initials}" if initials else family)
+            elif author.get('name'):
+                names.append(author['name'])
+        
+        if len(names) > 20:
+            authors = ', '.join(names[:19]) + ', ... ' + names[-1]
+        elif len(names) > 1:
+            authors = ', '.join(names[:-1]) + ', & ' + names[-1]
+        else:
+            authors = names[0] if names else None
+        
+        year = None
+        for field in ('published-print', 'published-online', 'issued'):
+            date_parts = (work.get(field) or {}).get('date-parts') or [[]]
+            if date_parts[0] and date_parts[0][0]:
+                year = date_parts[0][0]
+                break
+        
+        title = title.strip()
+        if not title.endswith(('.', '?', '!')):
+            title += '.'
+        
+        parts = [f"{authors} ({year or 'n.d.'}).", title] if authors else [title, f"({year or 'n.d.'})."]
+        
+        journal = work.get('container-title', [None])[0] if work.get('container-title') else None
+        if journal:
+            source = journal
+            if work.get('volume'):
+                source += f", {work['volume']}"
+                if work.get('issue'):
+                    source += f"({work['issue']})"
+            if work.get('page'):
+                source += f", {work['page'].replace('-', '–')}"
+            parts.append(source + '.')
+        elif work.get('publisher'):
+            parts.append(f"{work['publisher']}.")
+        
+        parts.append(f"https://doi.org/{doi}")
+        return ' '.join(parts)
+    
+    async def _wait_for_rate_limit(self):
+        """Sleep until any back-off requested by the citation API has elapsed."""
+        delay = self._rate_limited_until - asyncio.get_running_loop().time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    
+    def _register_rate_limit(self, retry_after: Optional[str]):
+        """Pause all requests sharing this service after a 429 response."""
+        try:
+            delay = float(retry_after) if retry_after else self.DEFAULT_RATE_LIMIT_DELAY
+        except ValueError:
+            delay = self.DEFAULT_RATE_LIMIT_DELAY
+        resume_at = asyncio.get_running_loop().time() + delay
+        self._rate_limited_until = max(self._rate_limited_until, resume_at)
+        logger.warning(f"Citation API rate limit hit, backing off for {delay:.1f}s")
+    
     async def _fetch_from_crossref(self, doi: str) -> Optional[CitationMetadata]:
         """Fetch citation from CrossRef API."""
+        key = self.normalize_doi(doi)
+        if _AGENCY_CACHE.get(key) == 'other':
+            return None
+        
         try:
             url = f"{self.CROSSREF_API}{doi}"
             headers = {'Accept': 'application/json'}
             
-            async with self.session.get(url, headers=headers, timeout=10) as response:
+            session = await get_session()
+            async with session.get(url, headers=headers, timeout=10) as response:
+                if response.status == 404:
+                    _AGENCY_CACHE.set(key, 'other')
                 if response.status == 200:
-                    data = await response.json()
+                    _AGENCY_CACHE.set(key, 'crossref')
+                    data = await _read_json(response)
                     work = data.get('message', {})
                     
                     metadata = CitationMetadata()
@@ -189,17 +519,17 @@ class CitationService:
                     # Extract authors
                     authors = work.get('author', [])
                     if authors:
-                        metadata.authors = []
-                        for author in authors:
-                            given = author.get('given', '')
-                            family = author.get('family', '')
-                            if family:
-                                full_name = f"{given} {family}".strip()
-                                metadata.authors.append(full_name)
+                        metadata.authors = [
+                            f"{a['given']} {a['family']}" if a.get('given') else a['family']
+                            for a in authors if a.get('family')
+                        ]
                     
-                    # Journal information
-                    metadata.journal = work.get('container-title', [None])[0] if work.get('container-title') else None
-                    metadata.publisher = work.get('publisher')
+                    # Journal information; the same few journals and publishers recur
+                    # across references, so share one string object per name
+                    journal = work.get('container-title', [None])[0] if work.get('container-title') else None
+                    metadata.journal = sys.intern(journal) if journal else None
+                    publisher = work.get('publisher')
+                    metadata.publisher = sys.intern(publisher) if publisher else None
                     
                     # Date information
                     published = work.get('published-print') or work.get('published-online')
@@ -229,9 +559,10 @@ class CitationService:
             url = f"{self.DATACITE_API}{doi}"
             headers = {'Accept': 'application/json'}
             
-            async with self.session.get(url, headers=headers, timeout=10) as response:
+            session = await get_session()
+            async with session.get(url, headers=headers, timeout=10) as response:
                 if response.status == 200:
-                    data = await response.json()
+                    data = await _read_json(response)
                     work = data.get('data', {}).get('attributes', {})
                     
                     metadata = CitationMetadata()
@@ -245,11 +576,12 @@ class CitationService:
                     # Authors (creators)
                     creators = work.get('creators', [])
                     if creators:
-                        metadata.authors = []
-                        for creator in creators:
-                            name = creator.get('name') or creator.get('givenName', '') + ' ' + creator.get('familyName', '')
-                            if name.strip():
-                                metadata.authors.append(name.strip())
+                        names = (
+                            creator.get('name')
+                            or f"{creator.get('givenName', '')} {creator.get('familyName', '')}"
+                            for creator in creators
+                        )
+                        metadata.authors = [name.strip() for name in names if name.strip()]
                     
                     # URL
                     metadata.url = f"https://doi.org/{doi}"
@@ -266,58 +598,44 @@ class CitationService:
         if not metadata:
             return "Unknown source"
             
-        if style.lower() == 'apa':
-            return self._format_apa(metadata)
-        elif style.lower() == 'mla':
-            return self._format_mla(metadata)
-        elif style.lower() == 'chicago':
-            return self._format_chicago(metadata)
-        else:
-            return self._format_apa(metadata)  # Default to APA
+        formatter = self._FORMATTERS.get(style.lower(), CitationService._format_apa)  # Default to APA
+        return formatter(self, metadata)
     
     def _format_apa(self, metadata: CitationMetadata) -> str:
         """Format citation in APA style."""
-        parts = []
-        
-        # Authors
-        if metadata.authors:
-            if len(metadata.authors) == 1:
-                parts.append(f"{metadata.authors[0]}.")
-            elif len(metadata.authors) <= 7:
-                author_list = ", ".join(metadata.authors[:-1]) + f", & {metadata.authors[-1]}"
-                parts.append(f"{author_list}.")
-            else:
-                # More than 7 authors, use et al.
-                parts.append(f"{metadata.authors[0]} et al.")
-        
-        # Year
-        if metadata.year:
-            parts.append(f"({metadata.year}).")
-        
-        # Title
-        if metadata.title:
-            parts.append(f"{metadata.title}.")
+        authors = metadata.authors
+        if not authors:
+            authors_str = None
+        elif len(authors) == 1:
+            authors_str = f"{authors[0]}."
+        elif len(authors) <= 7:
+            authors_str = f"{', '.join(authors[:-1])}, & {authors[-1]}."
+        else:
+            # More than 7 authors, use et al.
+            authors_str = f"{authors[0]} et al."
         
         # Journal/Publisher info
         if metadata.journal:
-            journal_info = f"*{metadata.journal}*"
+            volume = ""
             if metadata.volume:
-                journal_info += f", {metadata.volume}"
-                if metadata.issue:
-                    journal_info += f"({metadata.issue})"
-            if metadata.pages:
-                journal_info += f", {metadata.pages}"
-            parts.append(f"{journal_info}.")
+                volume = f", {metadata.volume}({metadata.issue})" if metadata.issue else f", {metadata.volume}"
+            pages = f", {metadata.pages}" if metadata.pages else ""
+            source_str = f"*{metadata.journal}*{volume}{pages}."
         elif metadata.publisher:
-            parts.append(f"{metadata.publisher}.")
+            source_str = f"{metadata.publisher}."
+        else:
+            source_str = None
         
         # DOI or URL
-        if metadata.doi:
-            parts.append(f"https://doi.org/{metadata.doi}")
-        elif metadata.url:
-            parts.append(metadata.url)
+        link = f"https://doi.org/{metadata.doi}" if metadata.doi else metadata.url
         
-        return " ".join(parts)
+        return " ".join(filter(None, (
+            authors_str,
+            f"({metadata.year})." if metadata.year else None,
+            f"{metadata.title}." if metadata.title else None,
+            source_str,
+            link,
+        )))
     
     def _format_mla(self, metadata: CitationMetadata) -> str:
         """Format citation in MLA style."""
@@ -394,12 +712,16 @@ class CitationService:
             parts.append(f"doi:{metadata.doi}.")
         
         return " ".join(parts)
+    
+    _FORMATTERS = {
+        'apa': _format_apa,
+        'mla': _format_mla,
+        'chicago': _format_chicago,
+    }
 
     def format_references_list(self, metadata_list: List[CitationMetadata], style: str = 'apa') -> List[str]:
         """Format a list of citations."""
-        references = []
-        for metadata in metadata_list:
-            citation = self.format_citation(metadata, style)
-            if citation and citation != "Unknown source":
-                references.append(citation)
-        return references
\ No newline at end of file
+        # Resolve the style once rather than per entry
+        formatter = self._FORMATTERS.get(style.lower(), CitationService._format_apa)
+        return [citation for metadata in metadata_list
+                if metadata and (citation := formatter(self, metadata))]
\ No newline at end of file
@@ -1,160 +1,130 @@
-import json
-from typing import List, Dict, Any
+from datetime import datetime
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 from models import FeedbackRequest
+from psycopg2 import errors
 from utils import get_db_connection
 
+# to_char() pattern matching datetime.isoformat() for UTC timestamps
+ISO_UTC_FORMAT = 'YYYY-MM-DD"T"HH24:MI:SS.US"+00:00"'
+
+# Rows fetched per round-trip when streaming favorites
+FAVORITES_FETCH_SIZE = 200
+
 class FeedbackService:
     def save_feedback(self, feedback: FeedbackRequest) -> Dict[str, Any]:
-        """Save user feedback for a query."""
+        """Save user feedback for a query, updating only the fields that were provided."""
         with get_db_connection() as conn:
             with conn.cursor() as cursor:
-                # Check if memory ID exists
-                cursor.execute("SELECT id FROM query_cache WHERE id = %s", (feedback.memory_id,))
-                if not cursor.fetchone():
+                try:
+                    # Single upsert; unset fields keep their stored values on update
+                    cursor.execute("""
+                        INSERT INTO user_feedback 
+                        (query_cache_id, feedback_text, rating, accuracy_rating, comprehensiveness_rating, helpfulness_rating, is_favorite)
+                        VALUES (%(memory_id)s, %(feedback_text)s, %(rating)s, %(accuracy_rating)s,
+                                %(comprehensiveness_rating)s, %(helpfulness_rating)s, COALESCE(%(is_favorite)s, FALSE))
+                        ON CONFLICT (query_cache_id) DO UPDATE SET
+                            feedback_text = COALESCE(EXCLUDED.feedback_text, user_feedback.feedback_text),
+                            rating = COALESCE(EXCLUDED.rating, user_feedback.rating),
+                            accuracy_rating = COALESCE(EXCLUDED.accuracy_rating, user_feedback.accuracy_rating),
+                            comprehensiveness_rating = COALESCE(EXCLUDED.comprehensiveness_rating, user_feedback.comprehensiveness_rating),
+                            helpfulness_rating = COALESCE(EXCLUDED.helpfulness_rating, user_feedback.helpfulness_rating),
+                            is_favorite = COALESCE(%(is_favorite)s, user_feedback.is_favorite),
+                            updated_at = CURRENT_TIMESTAMP
+                        RETURNING id, (xmax = 0) AS inserted
+                    """, {
+                        "memory_id": feedback.memory_id,
+                        "feedback_text": feedback.feedback_text,
+                        "rating": feedback.rating,
+                        "accuracy_rating": feedback.accuracy_rating,
+                        "comprehensiveness_rating": feedback.comprehensiveness_rating,
+                        "helpfulness_rating": feedback.helpfulness_rating,
+                        "is_favorite": feedback.is_favorite,
+                    })
+                except errors.ForeignKeyViolation:
+                    conn.rollback()
                     return {
                         "status": "error",
                         "message": f"Memory entry with ID {feedback.memory_id} not found"
                     }
                 
-                # Check if feedback already exists
-                cursor.execute("SELECT id FROM user_feedback WHERE query_cache_id = %s", (feedback.memory_id,))
-                existing_feedback = cursor.fetchone()
+                row = cursor.fetchone()
+                conn.commit()
                 
-                if existing_feedback:
-                    # Update existing feedback
-                    update_parts = []
-                    update_values = []
-                    
-                    if feedback.feedback_text is not None:
-                        update_parts.append("feedback_text = %s")
-                        update_values.append(feedback.feedback_text)
-                        
-                    if feedback.rating is not None:
-                        update_parts.append("rating = %s")
-                        update_values.append(feedback.rating)
-                    
-                    if feedback.accuracy_rating is not None:
-                        update_parts.append("accuracy_rating = %s")
-                        update_values.append(feedback.accuracy_rating)
-                    
-                    if feedback.comprehensiveness_rating is not None:
-                        update_parts.append("comprehensiveness_rating = %s")
-                        update_values.append(feedback.comprehensiveness_rating)
-                    
-                    if feedback.helpfulness_rating is not None:
-                        update_parts.append("helpfulness_rating = %s")
-                        update_values.append(feedback.helpfulness_rating)
-                        
-                    if feedback.is_favorite is not None:
-                        update_parts.append("is_favorite = %s")
-                        update_values.append(feedback.is_favorite)
-                    
-                    update_parts.append("updated_at = CURRENT_TIMESTAMP")
-                    
-                    if update_parts:
-                        query = f"""
-                            UPDATE user_feedback 
-                            SET {", ".join(update_parts)}
-                            WHERE id = %s
-                            RETURNING id
-                        """
-                        update_values.append(existing_feedback['id'])
-                        cursor.execute(query, update_values)
-                        updated_id = cursor.fetchone()['id']
-                        conn.commit()
-                        
-                        return {
-                            "status": "success",
-                            "message": "Feedback updated successfully",
-                            "id": updated_id
-                        }
-                else:
-                    # Create new feedback
-                    cursor.execute("""
-                        INSERT INTO user_feedback 
-                        (query_cache_id, feedback_text, rating, accuracy_rating, comprehensiveness_rating, helpfulness_rating, is_favorite)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s)
-                        RETURNING id
-                    """, (
-                        feedback.memory_id,
-                        feedback.feedback_text,
-                        feedback.rating,
-                        feedback.accuracy_rating,
-                        feedback.comprehensiveness_rating,
-                        feedback.helpfulness_rating,
-                        feedback.is_favorite if feedback.is_favorite is not None else False
-                    ))
-                    
-                    new_id = cursor.fetchone()['id']
-                    conn.commit()
-                    
-                    return {
-                        "status": "success",
-                        "message": "Feedback saved successfully",
-                        "id": new_id
-                    }
+                return {
+                    "status": "success",
+                    "message": "Feedback saved successfully" if row["inserted"] else "Feedback updated successfully",
+                    "id": row["id"]
+                }
     
-    def get_favorites(self) -> List[Dict[str, Any]]:
-        """Get all favorite queries."""
+    def get_favorites(self, limit: Optional[int] = None,
+                      after: Optional[Tuple[datetime, int]] = None,
+                      preview_chars: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get favorite queries, newest first.
+        
+        With `limit`, returns one page; pass the (favorited_at, feedback_id) of the
+        last row as `after` to get the next one. `preview_chars` truncates
+        answer_text for list views.
+        """
+        return list(self.iter_favorites(limit, after, preview_chars))
+    
+    def iter_favorites(self, limit: Optional[int] = None,
+                       after: Optional[Tuple[datetime, int]] = None,
+                       preview_chars: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Yield favorites like get_favorites, pulling rows from a server-side cursor in batches."""
+        conditions = ["uf.is_favorite = true"]
+        params: List[Any] = [preview_chars]
+        if after:
+            conditions.append("(uf.created_at, uf.id) < (%s, %s)")
+            params.extend(after)
+        limit_clause = ""
+        if limit:
+            limit_clause = "LIMIT %s"
+            params.append(limit)
+        
         with get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute("""
+            # Named cursor => server-side, so only FAVORITES_FETCH_SIZE rows are held at a time
+            with conn.cursor(name="favorites_stream") as cursor:
+                cursor.itersize = FAVORITES_FETCH_SIZE
+                cursor.execute(f"""
                     SELECT 
                         qc.id,
+                        qc.id AS query_cache_id,
+                        uf.id AS feedback_id,
                         qc.query_text,
-                        qc.answer_text,
-                        qc.references,
-                        qc.created_at,
+                        COALESCE(LEFT(qc.answer_text, %s), qc.answer_text) AS answer_text,
+                        CASE WHEN jsonb_typeof(qc."references") = 'array'
+                             THEN qc."references" ELSE '[]'::jsonb END AS "references",
+                        to_char(qc.created_at AT TIME ZONE 'UTC', '{ISO_UTC_FORMAT}') AS created_at,
                         uf.rating,
                         uf.accuracy_rating,
                         uf.comprehensiveness_rating,
                         uf.helpfulness_rating,
                         uf.feedback_text,
-                        uf.created_at as favorited_at
+                        to_char(uf.created_at AT TIME ZONE 'UTC', '{ISO_UTC_FORMAT}') AS favorited_at
                     FROM query_cache qc
                     INNER JOIN user_feedback uf ON qc.id = uf.query_cache_id
-                    WHERE uf.is_favorite = true
-                    ORDER BY uf.created_at DESC
-                """)
+                    WHERE {" AND ".join(conditions)}
+                    ORDER BY uf.created_at DESC, uf.id DESC
+                    {limit_clause}
+                """, params)
                 
-                favorites = cursor.fetchall()
-                
-                return [
-                    {
-                        "id": fav["id"],
-                        "query_cache_id": fav["id"],
-                        "query_text": fav["query_text"],
-                        "answer_text": fav["answer_text"],
-                        "references": fav["references"] if isinstance(fav["references"], list) else (json.loads(fav["references"]) if fav["references"] else []),
-                        "created_at": fav["created_at"].isoformat() if fav["created_at"] else None,
-                        "rating": fav["rating"],
-                        "accuracy_rating": fav["accuracy_rating"],
-                        "comprehensiveness_rating": fav["comprehensiveness_rating"],
-                        "helpfulness_rating": fav["helpfulness_rating"],
-                        "feedback_text": fav["feedback_text"],
-                        "favorited_at": fav["favorited_at"].isoformat() if fav["favorited_at"] else None
-                    }
-                    for fav in favorites
-                ]
+                for fav in cursor:
+                    yield dict(fav)
     
     def delete_feedback(self, memory_id: int) -> Dict[str, Any]:
         """Delete user feedback for a query."""
         with get_db_connection() as conn:
             with conn.cursor() as cursor:
-                # Check if feedback exists
-                cursor.execute("SELECT id FROM user_feedback WHERE query_cache_id = %s", (memory_id,))
-                existing_feedback = cursor.fetchone()
+                cursor.execute("DELETE FROM user_feedback WHERE query_cache_id = %s RETURNING id", (memory_id,))
+                deleted = cursor.fetchall()
+                conn.commit()
                 
-                if not existing_feedback:
+                if not deleted:
                     return {
                         "status": "error",
                         "message": f"No feedback found for memory ID {memory_id}"
                     }
                 
-                # Delete the feedback
-                cursor.execute("DELETE FROM user_feedback WHERE query_cache_id = %s", (memory_id,))
-                conn.commit()
-                
                 return {
                     "status": "success",
                     "message": "Feedback deleted successfully"
@@ -164,8 +134,10 @@ class FeedbackService:
         """Get feedback for a specific query."""
         with get_db_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute("""
-                    SELECT rating, accuracy_rating, comprehensiveness_rating, helpfulness_rating, feedback_text, is_favorite, created_at, updated_at
+                cursor.execute(f"""
+                    SELECT rating, accuracy_rating, comprehensiveness_rating, helpfulness_rating, feedback_text, is_favorite,
+                           to_char(created_at AT TIME ZONE 'UTC', '{ISO_UTC_FORMAT}') AS created_at,
+                           to_char(updated_at AT TIME ZONE 'UTC', '{ISO_UTC_FORMAT}') AS updated_at
                     FROM user_feedback 
                     WHERE query_cache_id = %s
                 """, (memory_id,))
@@ -187,7 +159,7 @@ class FeedbackService:
                         "helpfulness_rating": feedback["helpfulness_rating"],
                         "feedback_text": feedback["feedback_text"],
                         "is_favorite": feedback["is_favorite"],
-                        "created_at": feedback["created_at"].isoformat() if feedback["created_at"] else None,
-                        "updated_at": feedback["updated_at"].isoformat() if feedback["updated_at"] else None
+                        "created_at": feedback["created_at"],
+                        "updated_at": feedback["updated_at"]
                     }
                 }
\ No newline at end of file
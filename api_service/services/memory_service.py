@@ -1,7 +1,7 @@
 import json
 import numpy as np
 from typing import List, Dict, Any, Optional
-from utils import get_db_connection, Config
+from utils import get_db_connection, vector_param, Config
 
 class MemoryService:
     def check_memory(self, query: str, query_embedding: List[float]) -> Optional[Dict[str, Any]]:
@@ -29,15 +29,15 @@ class MemoryService:
                     return self._format_memory_response(exact_match, query)
                 
                 # Check for semantic similarity
-                embedding_str = '[' + ','.join(map(str, query_embedding)) + ']'
                 cursor.execute("""
+                    WITH q AS (SELECT %s::vector AS v)
                     SELECT id, query_text as query, answer_text as answer, "references", chunk_ids as chunks, entities, communities,
-                           1 - (query_embedding <=> %s::vector) as similarity
-                    FROM query_cache
-                    WHERE 1 - (query_embedding <=> %s::vector) > %s
-                    ORDER BY query_embedding <=> %s::vector
+                           1 - (query_embedding <=> q.v) as similarity
+                    FROM query_cache CROSS JOIN q
+                    WHERE 1 - (query_embedding <=> q.v) > %s
+                    ORDER BY query_embedding <=> q.v
                     LIMIT 1
-                """, (embedding_str, embedding_str, Config.MEMORY_SIMILARITY_THRESHOLD, embedding_str))
+                """, (vector_param(query_embedding), Config.MEMORY_SIMILARITY_THRESHOLD))
                 
                 similar_match = cursor.fetchone()
                 if similar_match:
@@ -67,32 +67,30 @@ class MemoryService:
         if chunks:
             with get_db_connection() as conn:
                 with conn.cursor() as cursor:
-                    for chunk_id in chunks:
-                        cursor.execute("""
-                            SELECT 
-                                dc.id, 
-                                dc.text_content, 
-                                dc.source_metadata
-                            FROM 
-                                document_chunks dc
-                            WHERE 
-                                dc.id = %s
-                        """, (chunk_id,))
-                        
-                        chunk = cursor.fetchone()
-                        if chunk:
-                            # Handle source_metadata (jsonb column returns dict, not string)
-                            if isinstance(chunk["source_metadata"], str):
-                                metadata = json.loads(chunk["source_metadata"])
-                            else:
-                                metadata = chunk["source_metadata"]
-                            
-                            formatted_chunks.append({
-                                "id": chunk["id"],
-                                "text": chunk["text_content"],
-                                "source": metadata.get("source", "Unknown source"),
-                                "similarity": 1.0  # Set to 1.0 for remembered results
-                            })
+                    # One round trip for all remembered chunks; the source is read
+                    # from the jsonb column server-side
+                    cursor.execute("""
+                        SELECT 
+                            dc.id, 
+                            dc.text_content, 
+                            COALESCE(dc.source_metadata->>'source', 'Unknown source') AS source
+                        FROM 
+                            document_chunks dc
+                        WHERE 
+                            dc.id = ANY(%s)
+                    """, (list(chunks),))
+                    chunks_by_id = {chunk["id"]: chunk for chunk in cursor.fetchall()}
+            
+            # Keep the remembered order
+            for chunk_id in chunks:
+                chunk = chunks_by_id.get(chunk_id)
+                if chunk:
+                    formatted_chunks.append({
+                        "id": chunk["id"],
+                        "text": chunk["text_content"],
+                        "source": chunk["source"],
+                        "similarity": 1.0  # Set to 1.0 for remembered results
+                    })
         
         return {
             "query": query,
@@ -117,7 +115,6 @@ class MemoryService:
                 with conn.cursor() as cursor:
                     # Prepare data for storage
                     chunk_ids = [chunk['id'] for chunk in chunks]
-                    embedding_str = '[' + ','.join(map(str, query_embedding)) + ']'
                     
                     cursor.execute("""
                         INSERT INTO query_cache 
@@ -126,7 +123,7 @@ class MemoryService:
                         RETURNING id
                     """, (
                         query,
-                        embedding_str,
+                        vector_param(query_embedding),
                         answer,
                         json.dumps(references),
                         json.dumps(chunk_ids),
@@ -0,0 +1,58 @@
+import hashlib
+from typing import Dict, List, Optional
+from utils import get_db_connection, vector_param, Config
+
+class PromptCacheService:
+    """Stores LLM classification/verification scores so repeated prompts skip the model."""
+    
+    @staticmethod
+    def make_key(*parts: str) -> bytes:
+        """Hash the identifying parts of a prompt into a cache key."""
+        return hashlib.sha256("|".join(parts).encode("utf-8")).digest()
+    
+    def get(self, prompt_hash: bytes) -> Optional[float]:
+        """Return the cached score for an exact prompt."""
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT score FROM qa_prompt_cache WHERE prompt_hash = %s", (prompt_hash,))
+                exact_match = cursor.fetchone()
+                return exact_match['score'] if exact_match else None
+    
+    def get_many(self, prompt_hashes: List[bytes]) -> Dict[bytes, float]:
+        """Return cached scores for many exact prompts in one query, keyed by prompt hash."""
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT prompt_hash, score FROM qa_prompt_cache WHERE prompt_hash = ANY(%s)",
+                    (prompt_hashes,)
+                )
+                return {bytes(row['prompt_hash']): row['score'] for row in cursor.fetchall()}
+    
+    def find_similar(self, chunk_id: int, model: str, embedding: List[float]) -> Optional[float]:
+        """Return the score of the closest cached question about the same chunk, if similar enough."""
+        embedding_param = vector_param(embedding)
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT score
+                    FROM qa_prompt_cache
+                    WHERE chunk_id = %s AND model = %s
+                      AND 1 - (embedding <=> %s::vector) >= %s
+                    ORDER BY embedding <=> %s::vector
+                    LIMIT 1
+                """, (chunk_id, model, embedding_param, Config.QA_PROMPT_CACHE_SIMILARITY, embedding_param))
+                similar_match = cursor.fetchone()
+                return similar_match['score'] if similar_match else None
+    
+    def store(self, prompt_hash: bytes, kind: str, score: float, model: str,
+              chunk_id: Optional[int] = None, embedding: Optional[List[float]] = None):
+        """Remember the score the model gave for a prompt."""
+        embedding_param = vector_param(embedding) if embedding else None
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO qa_prompt_cache (prompt_hash, kind, chunk_id, embedding, score, model)
+                    VALUES (%s, %s, %s, %s::vector, %s, %s)
+                    ON CONFLICT (prompt_hash) DO NOTHING
+                """, (prompt_hash, kind, chunk_id, embedding_param, score, model))
+                conn.commit()
@@ -1,14 +1,51 @@
 import json
+import asyncio
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
 from typing import List, Dict, Any, Optional
 from openai import OpenAI
-from utils import get_db_connection, Config
+from utils import get_db_connection, execute_prepared, vector_param, Config
 from .memory_service import MemoryService
 from .graph_service import GraphService
 from .citation_service import CitationService, CitationMetadata
-from utils.document_db import get_documents_by_ids, get_citation_for_source
+from utils.document_db import get_documents_by_ids, get_citations_for_sources
 # from .ragas_service import RagasService  # Temporarily disabled due to version conflict
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# Hot query embeddings, keyed by the hash of the normalized query text
+_QUERY_EMBEDDINGS: "OrderedDict[bytes, List[float]]" = OrderedDict()
+_QUERY_EMBEDDINGS_LOCK = threading.Lock()
+QUERY_EMBEDDING_LRU_SIZE = 1024
+
+# Ordering by the distance alias keeps the query index-friendly
+# while binding the query vector only once
+VECTOR_SEARCH_SQL = """
+    SELECT id, text_content, document_id, 1 - distance as similarity, source
+    FROM (
+        SELECT 
+            dc.id, 
+            dc.text_content, 
+            dc.document_id,
+            ce.embedding_vector <=> $1::vector as distance,
+            COALESCE(dc.source_metadata->>'source', 'Unknown source') as source
+        FROM 
+            chunk_embeddings ce
+        JOIN 
+            document_chunks dc ON ce.chunk_id = dc.id
+        ORDER BY 
+            distance
+        LIMIT $2
+    ) nearest
+    ORDER BY distance
+"""
+
 class QueryService:
     def __init__(self):
         self.client = OpenAI(api_key=Config.OPENAI_API_KEY)
@@ -25,79 +62,133 @@ class QueryService:
         )
         return response.data[0].embedding
     
+    def create_embeddings_batch(self, texts: List[str], batch_size: int = 512) -> List[List[float]]:
+        """Create embeddings for many texts with one OpenAI request per `batch_size` texts."""
+        embeddings = []
+        for start in range(0, len(texts), batch_size):
+            response = self.client.embeddings.create(
+                input=texts[start:start + batch_size],
+                model="text-embedding-ada-002"
+            )
+            embeddings.extend(item.embedding for item in response.data)
+        return embeddings
+    
+    def create_embedding_cached(self, text: str) -> List[float]:
+        """Embed a query, reusing earlier embeddings of the same normalized text."""
+        if not Config.ENABLE_QUERY_EMBEDDING_CACHE:
+            return self.create_embedding(text)
+        
+        normalized = " ".join(text.lower().split())
+        query_hash = hashlib.sha256(normalized.encode("utf-8")).digest()
+        
+        with _QUERY_EMBEDDINGS_LOCK:
+            embedding = _QUERY_EMBEDDINGS.get(query_hash)
+            if embedding is not None:
+                _QUERY_EMBEDDINGS.move_to_end(query_hash)
+                return embedding
+        
+        try:
+            embedding = self._load_query_embedding(query_hash)
+        except Exception as e:
+            print(f"Error reading query embedding cache: {e}")
+            embedding = None
+        
+        if embedding is None:
+            embedding = self.create_embedding(normalized)
+            try:
+                self._store_query_embedding(query_hash, embedding)
+            except Exception as e:
+                print(f"Error writing query embedding cache: {e}")
+        
+        with _QUERY_EMBEDDINGS_LOCK:
+            _QUERY_EMBEDDINGS[query_hash] = embedding
+            if len(_QUERY_EMBEDDINGS) > QUERY_EMBEDDING_LRU_SIZE:
+                _QUERY_EMBEDDINGS.popitem(last=False)
+        return embedding
+    
+    def _load_query_embedding(self, query_hash: bytes) -> Optional[List[float]]:
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT embedding::text AS embedding FROM query_embedding_cache WHERE query_hash = %s",
+                    (query_hash,)
+                )
+                row = cursor.fetchone()
+                # pgvector's text form is a JSON array
+                return _json_loads(row['embedding']) if row else None
+    
+    def _store_query_embedding(self, query_hash: bytes, embedding: List[float]):
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO query_embedding_cache (query_hash, embedding)
+                    VALUES (%s, %s::vector)
+                    ON CONFLICT (query_hash) DO NOTHING
+                """, (query_hash, vector_param(embedding)))
+    
     def vector_search(self, query_embedding: List[float], max_results: int = 5) -> List[Dict[str, Any]]:
         """Perform vector similarity search."""
         with get_db_connection() as conn:
             with conn.cursor() as cursor:
-                # Convert embedding list to a string representation for pgvector
-                embedding_str = '[' + ','.join(map(str, query_embedding)) + ']'
-                
-                cursor.execute("""
-                    SELECT 
-                        dc.id, 
-                        dc.text_content, 
-                        dc.source_metadata,
-                        dc.document_id,
-                        1 - (ce.embedding_vector <=> %s::vector) as similarity
-                    FROM 
-                        chunk_embeddings ce
-                    JOIN 
-                        document_chunks dc ON ce.chunk_id = dc.id
-                    ORDER BY 
-                        ce.embedding_vector <=> %s::vector
-                    LIMIT %s
-                """, (embedding_str, embedding_str, max_results))
-                
+                # Candidate list size for the HNSW index scan; must cover max_results
+                cursor.execute("SET LOCAL hnsw.ef_search = %s", (max(40, max_results * 4),))
+                execute_prepared(cursor, "vector_search", VECTOR_SEARCH_SQL, (vector_param(query_embedding), max_results))
                 results = cursor.fetchall()
                 return results
     
+    async def vector_search_async(self, query_embedding: List[float], max_results: int = 5) -> List[Dict[str, Any]]:
+        """vector_search on a worker thread, so the event loop keeps serving other requests."""
+        return await asyncio.to_thread(self.vector_search, query_embedding, max_results)
+    
     async def generate_academic_references(self, chunks: List[Dict], style: str = None) -> List[str]:
         """Generate proper academic citations for chunks using DOI-only approach."""
         if style is None:
             style = Config.CITATION_STYLE
             
         references = []
-        processed_documents = set()
+        processed_references = set()
         
-        # Convert chunks to dictionaries if they're tuples (from vector_search)
-        if chunks and isinstance(chunks[0], tuple):
-            chunks = [
-                {
-                    "id": chunk[0],
-                    "text_content": chunk[1],
-                    "source_metadata": chunk[2],
-                    "document_id": chunk[3],
-                    "similarity": chunk[4]
-                }
-                for chunk in chunks
-            ]
-        
-        # Get unique document IDs
-        document_ids = list(set(chunk.get('document_id') for chunk in chunks if chunk.get('document_id')))
+        # Unique document IDs in first-seen order; chunks from the same source
+        # file ingested more than once still resolve to a single reference
+        document_ids = list(dict.fromkeys(
+            chunk['document_id'] for chunk in chunks if chunk.get('document_id')
+        ))
         
         # Get document metadata for all documents at once
-        from utils.document_db import get_documents_by_ids
         documents_by_id = get_documents_by_ids(document_ids) if document_ids else {}
         
-        for chunk in chunks:
-            document_id = chunk.get('document_id')
+        for document_id in document_ids:
+            doc = documents_by_id.get(document_id)
+            if not doc:
+                continue
             
-            # Skip if no document_id or already processed
-            if not document_id or document_id in processed_documents:
+            # Priority 1: Use pre-fetched academic citation
+            if doc.get('citation_fetched') and doc.get('reference'):
+                reference = doc['reference']
+            # Priority 2: Use DOI link if available
+            elif doc.get('doi'):
+                reference = f"https://doi.org/{doc['doi']}"
+            # No fallback to filename - skip if no citation or DOI
+            else:
                 continue
-            processed_documents.add(document_id)
             
-            # Get document from our fetched documents
-            if document_id in documents_by_id:
-                doc = documents_by_id[document_id]
-                
-                # Priority 1: Use pre-fetched academic citation
-                if doc.get('citation_fetched') and doc.get('reference'):
-                    references.append(doc['reference'])
-                # Priority 2: Use DOI link if available
-                elif doc.get('doi'):
-                    references.append(f"https://doi.org/{doc['doi']}")
-                # No fallback to filename - skip if no citation or DOI
+            if reference not in processed_references:
+                processed_references.add(reference)
+                references.append(reference)
+        
+        # Chunks stored without a document link are matched by source filename,
+        # all in one lookup
+        unlinked_sources = [
+            chunk['source'] for chunk in chunks
+            if not chunk.get('document_id') and chunk.get('source')
+        ]
+        if unlinked_sources:
+            citations_by_source = get_citations_for_sources(unlinked_sources)
+            for source in dict.fromkeys(unlinked_sources):
+                reference = citations_by_source.get(source)
+                if reference and reference not in processed_references:
+                    processed_references.add(reference)
+                    references.append(reference)
         
         return references
     
@@ -244,7 +335,7 @@ class QueryService:
     async def process_query(self, query: str, max_results: int = 5, use_memory: bool = True) -> Dict[str, Any]:
         """Process a user query with optional memory lookup."""
         # Create query embedding
-        query_embedding = self.create_embedding(query)
+        query_embedding = self.create_embedding_cached(query)
         
         # Check memory if enabled
         if Config.ENABLE_MEMORY and use_memory:
@@ -253,22 +344,7 @@ class QueryService:
                 return memory_result
         
         # Perform vector search
-        chunks = self.vector_search(query_embedding, max_results)
-        
-        # Convert chunks to dictionaries if they're tuples
-        if chunks and isinstance(chunks[0], tuple):
-            chunks_dict = [
-                {
-                    "id": chunk[0],
-                    "text_content": chunk[1],
-                    "source_metadata": chunk[2],
-                    "document_id": chunk[3],
-                    "similarity": chunk[4]
-                }
-                for chunk in chunks
-            ]
-        else:
-            chunks_dict = chunks
+        chunks = await self.vector_search_async(query_embedding, max_results)
         
         # Load graph data and enhance results
         entities, communities = self.graph_service.enhance_with_graph(chunks)
@@ -282,7 +358,7 @@ class QueryService:
         )
         
         # Get document metadata for chunks to include DOI info
-        document_ids = list(set(chunk.get('document_id') for chunk in chunks_dict if chunk.get('document_id')))
+        document_ids = list(set(chunk.get('document_id') for chunk in chunks if chunk.get('document_id')))
         documents_by_id = get_documents_by_ids(document_ids) if document_ids else {}
         
         # Format response
@@ -293,11 +369,10 @@ class QueryService:
                 {
                     "id": chunk["id"],
                     "text": chunk["text_content"],
-                    "source": (json.loads(chunk["source_metadata"]) if isinstance(chunk["source_metadata"], str) 
-                             else chunk["source_metadata"]).get("source", "Unknown source"),
+                    "source": chunk["source"],
                     "similarity": float(chunk["similarity"]),
                     "doi": documents_by_id.get(chunk.get('document_id'), {}).get('doi', None)
-                } for chunk in chunks_dict
+                } for chunk in chunks
             ],
             "entities": entities[:10],  # Top 10 entities
             "communities": communities[:5],  # Top 5 communities
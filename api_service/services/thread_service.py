@@ -239,7 +239,7 @@ class ThreadService:
         
         if enhance_with_retrieval and Config.ENABLE_DIALOG_RETRIEVAL:
             # Perform vector search
-            query_embedding = self.query_service.create_embedding(message)
+            query_embedding = self.query_service.create_embedding_cached(message)
             retrieved_chunks = self.query_service.vector_search(query_embedding, max_results)
             
             if retrieved_chunks:
@@ -251,12 +251,7 @@ class ThreadService:
                 
                 # Extract references
                 for chunk in retrieved_chunks:
-                    # Handle source_metadata (jsonb column returns dict, not string)
-                    if isinstance(chunk['source_metadata'], str):
-                        metadata = json.loads(chunk['source_metadata'])
-                    else:
-                        metadata = chunk['source_metadata']
-                    source = metadata.get('source', 'Unknown source')
+                    source = chunk['source']
                     if source not in references:
                         references.append(source)
                 
@@ -269,8 +264,7 @@ class ThreadService:
                     {
                         "id": chunk["id"],
                         "text": chunk["text_content"],
-                        "source": (json.loads(chunk["source_metadata"]) if isinstance(chunk["source_metadata"], str) 
-                                 else chunk["source_metadata"]).get("source", "Unknown source"),
+                        "source": chunk["source"],
                         "similarity": float(chunk["similarity"])
                     } for chunk in retrieved_chunks
                 ]
@@ -1,2 +1,2 @@
-from .database import get_db_connection
+from .database import get_db_connection, execute_prepared, vector_param
 from .config import Config
\ No newline at end of file
@@ -1,5 +1,7 @@
 import os
-from typing import Optional
+import hmac
+from types import MappingProxyType
+from typing import Mapping, Optional
 from fastapi import Request, HTTPException
 
 class AdminManager:
@@ -10,6 +12,15 @@ class AdminManager:
         self.admin_enabled = os.getenv('ENABLE_ADMIN_MODE', 'true').lower() == 'true'
         # Admin password/token (optional for additional security)
         self.admin_token = os.getenv('ADMIN_TOKEN', '')
+        # Both inputs are fixed at startup, so the info payload is built once
+        self._info = MappingProxyType({
+            "admin_mode_enabled": self.admin_enabled,
+            "token_auth_configured": bool(self.admin_token),
+            "access_methods": MappingProxyType({
+                "query_param": "?admin=true" if self.admin_enabled else "?admin=<token>",
+                "header": "X-Admin-Mode: true" if self.admin_enabled else "X-Admin-Token: <token>"
+            })
+        })
     
     def is_admin_request(self, request: Request) -> bool:
         """
@@ -20,25 +31,45 @@ class AdminManager:
         2. Query parameter: ?admin=<token> (if ADMIN_TOKEN is set)
         3. Header: X-Admin-Mode: true (if ENABLE_ADMIN_MODE is true)
         4. Header: X-Admin-Token: <token> (if ADMIN_TOKEN is set)
+        
+        The result is cached on request.state, so repeated checks within one
+        request (dependency + route body) only inspect the request once.
         """
+        cached = getattr(request.state, 'is_admin', None)
+        if cached is not None:
+            return cached
+        
+        is_admin = self._check_admin_request(request)
+        request.state.is_admin = is_admin
+        return is_admin
+    
+    def _check_admin_request(self, request: Request) -> bool:
+        """Inspect query parameters and headers for admin credentials."""
+        if not self.admin_enabled and not self.admin_token:
+            return False
+        admin_param = request.query_params.get('admin')
+        headers = request.headers
+        
         # Check environment-based admin mode
         if self.admin_enabled:
             # Check query parameter
-            if request.query_params.get('admin') == 'true':
+            if admin_param == 'true':
                 return True
             
             # Check header
-            if request.headers.get('x-admin-mode') == 'true':
+            if headers.get('x-admin-mode') == 'true':
                 return True
         
-        # Check token-based admin mode
+        # Check token-based admin mode, comparing in constant time
         if self.admin_token:
+            token = self.admin_token.encode()
             # Check query parameter token
-            if request.query_params.get('admin') == self.admin_token:
+            if admin_param and hmac.compare_digest(admin_param.encode(), token):
                 return True
             
             # Check header token
-            if request.headers.get('x-admin-token') == self.admin_token:
+            header_token = headers.get('x-admin-token')
+            if header_token and hmac.compare_digest(header_token.encode(), token):
                 return True
         
         return False
@@ -54,16 +85,21 @@ class AdminManager:
                 detail=f"Admin access required for {operation_name}. Enable admin mode or provide admin token."
             )
     
-    def get_admin_info(self) -> dict:
-        """Get information about admin mode configuration."""
-        return {
-            "admin_mode_enabled": self.admin_enabled,
-            "token_auth_configured": bool(self.admin_token),
-            "access_methods": {
-                "query_param": "?admin=true" if self.admin_enabled else "?admin=<token>",
-                "header": "X-Admin-Mode: true" if self.admin_enabled else "X-Admin-Token: <token>"
-            }
-        }
+    def get_admin_info(self) -> Mapping:
+        """Get information about admin mode configuration (read-only)."""
+        return self._info
 
 # Global admin manager instance
-admin_manager = AdminManager()
\ No newline at end of file
+admin_manager = AdminManager()
+
+
+async def admin_dep(request: Request) -> bool:
+    """FastAPI dependency resolving (and caching) the request's admin status."""
+    return admin_manager.is_admin_request(request)
+
+
+def admin_required(operation_name: str = "operation"):
+    """FastAPI dependency that rejects non-admin requests with 403 before the route runs."""
+    async def dependency(request: Request):
+        admin_manager.require_admin(request, operation_name)
+    return dependency
@@ -2,8 +2,11 @@ import os
 
 class Config:
     DB_URL = os.environ.get("DATABASE_URL")
+    DB_POOL_MIN_CONNECTIONS = int(os.environ.get("DB_POOL_MIN_CONNECTIONS", "4"))
+    DB_POOL_MAX_CONNECTIONS = int(os.environ.get("DB_POOL_MAX_CONNECTIONS", "32"))
     OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
     ANTHROPIC_API_KEY = os.environ.get("ANTHROPIC_API_KEY")
+    OPENAI_MAX_CONCURRENCY = int(os.environ.get("OPENAI_MAX_CONCURRENCY", "8"))
     GRAPH_OUTPUT_PATH = os.environ.get("GRAPH_OUTPUT_PATH", "/app/graph_data")
     ENABLE_MEMORY = os.environ.get("ENABLE_MEMORY", "true").lower() == "true"
     MEMORY_SIMILARITY_THRESHOLD = float(os.environ.get("MEMORY_SIMILARITY_THRESHOLD", "0.95"))
@@ -12,6 +15,7 @@ class Config:
     # Citation Configuration
     ENABLE_ACADEMIC_CITATIONS = os.environ.get("ENABLE_ACADEMIC_CITATIONS", "true").lower() == "true"
     CITATION_STYLE = os.environ.get("CITATION_STYLE", "apa").lower()  # apa, mla, chicago
+    CITATION_CACHE_TTL = int(os.environ.get("CITATION_CACHE_TTL", "3600"))  # seconds
     
     # Enhanced QA Configuration
     ENABLE_ENHANCED_QA = os.environ.get("ENABLE_ENHANCED_QA", "true").lower() == "true"
@@ -22,6 +26,9 @@ class Config:
     VERIFICATION_THRESHOLD = float(os.environ.get("VERIFICATION_THRESHOLD", "0.7"))
     MAX_SUBQUESTIONS = int(os.environ.get("MAX_SUBQUESTIONS", "4"))
     AMPLIFICATION_MIN_CONTEXT_LENGTH = int(os.environ.get("AMPLIFICATION_MIN_CONTEXT_LENGTH", "500"))
+    ENABLE_QA_PROMPT_CACHE = os.environ.get("ENABLE_QA_PROMPT_CACHE", "true").lower() == "true"
+    QA_PROMPT_CACHE_SIMILARITY = float(os.environ.get("QA_PROMPT_CACHE_SIMILARITY", "0.97"))
+    ENABLE_QUERY_EMBEDDING_CACHE = os.environ.get("ENABLE_QUERY_EMBEDDING_CACHE", "true").lower() == "true"
 
     # Retrieval evaluation config
     USE_LLM_RETRIEVAL_EVAL_DEFAULT = os.environ.get("USE_LLM_RETRIEVAL_EVAL_DEFAULT", "false").lower() == "true"
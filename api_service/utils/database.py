@@ -1,6 +1,96 @@
+import threading
+import weakref
+from contextlib import contextmanager
+
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, register_default_jsonb
+from psycopg2.pool import ThreadedConnectionPool
 from .config import Config
 
+try:
+    import orjson
+    # Decode jsonb columns with orjson instead of the stdlib parser
+    register_default_jsonb(globally=True, loads=orjson.loads)
+except ImportError:
+    pass
+
+try:
+    import numpy as np
+    from pgvector.psycopg2 import register_vector
+    PGVECTOR_AVAILABLE = True
+except ImportError:
+    PGVECTOR_AVAILABLE = False
+
+_pool = None
+_pool_lock = threading.Lock()
+# Blocks callers while every pooled connection is checked out, instead of
+# ThreadedConnectionPool raising PoolError
+_pool_slots = threading.BoundedSemaphore(Config.DB_POOL_MAX_CONNECTIONS)
+# Names of the statements already PREPAREd on each pooled connection
+_prepared_statements = weakref.WeakKeyDictionary()
+
+
+class _VectorConnectionPool(ThreadedConnectionPool):
+    """Registers the pgvector binary adapter on every new pooled connection."""
+
+    def _connect(self, key=None):
+        conn = super()._connect(key)
+        if PGVECTOR_AVAILABLE:
+            register_vector(conn)
+            conn.commit()
+        return conn
+
+
+def _get_pool() -> ThreadedConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = _VectorConnectionPool(
+                    Config.DB_POOL_MIN_CONNECTIONS,
+                    Config.DB_POOL_MAX_CONNECTIONS,
+                    Config.DB_URL,
+                    cursor_factory=RealDictCursor
+                )
+    return _pool
+
+
+@contextmanager
 def get_db_connection():
-    return psycopg2.connect(Config.DB_URL, cursor_factory=RealDictCursor)
\ No newline at end of file
+    """Borrow a pooled connection for the duration of a ``with`` block.
+
+    The transaction is committed on success and rolled back on error, as with
+    ``with psycopg2.connect(...)``, and the connection is then returned to the pool.
+    """
+    pool = _get_pool()
+    with _pool_slots:
+        conn = pool.getconn()
+        try:
+            with conn:
+                yield conn
+        finally:
+            pool.putconn(conn, close=bool(conn.closed))
+
+
+def execute_prepared(cursor, name: str, statement: str, params: tuple):
+    """Run ``statement`` (written with $1, $2, ... placeholders) as a server-side
+    prepared statement, so Postgres parses and plans it once per connection.
+    """
+    prepared = _prepared_statements.setdefault(cursor.connection, set())
+    if name not in prepared:
+        cursor.execute(f"PREPARE {name} AS {statement}")
+        prepared.add(name)
+    placeholders = ", ".join(["%s"] * len(params))
+    cursor.execute(f"EXECUTE {name} ({placeholders})", params)
+
+
+def vector_param(embedding):
+    """Query parameter for a ``%s::vector`` placeholder.
+
+    With pgvector installed the embedding is passed as a float32 array and the
+    registered adapter renders it as pgvector's text literal (psycopg2 has no
+    binary parameters); otherwise the literal is built here.
+    """
+    if PGVECTOR_AVAILABLE:
+        return np.asarray(embedding, dtype=np.float32)
+    return '[' + ','.join(map(str, embedding)) + ']'
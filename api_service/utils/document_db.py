@@ -3,105 +3,314 @@ Database operations for document metadata and citations.
 """
 
 import psycopg2
+import psycopg2.extensions
+from psycopg2.extras import execute_values
 import json
-from typing import List, Dict, Optional, Any
+import warnings
+from contextlib import contextmanager
+from typing import List, Dict, Iterator, Optional, Any, Tuple
 from datetime import datetime
 from .config import Config
+from .database import get_db_connection as get_pooled_connection, execute_prepared
+from .ttl_cache import TTLCache
 
 
+@contextmanager
 def get_db_connection():
-    """Get a database connection."""
+    """Borrow a connection from the shared API pool, with plain tuple cursors.
+
+    Commits on success and rolls back on error, like ``with psycopg2.connect(...)``.
+    """
+    with get_pooled_connection() as conn:
+        cursor_factory = conn.cursor_factory
+        conn.cursor_factory = psycopg2.extensions.cursor
+        try:
+            yield conn
+        finally:
+            conn.cursor_factory = cursor_factory
+
+
+def open_dedicated_connection():
+    """Open a connection outside the pool, for sessions that outlive one operation."""
     return psycopg2.connect(Config.DB_URL)
 
 
-def get_documents_without_citations(limit: int = 50) -> List[Dict[str, Any]]:
-    """Get documents that haven't had their citations fetched yet."""
+# Citation metadata read on every query. Writes in this process invalidate the
+# affected entries; writes from other processes (the citation fetcher) show up
+# once the TTL lapses.
+_DOCUMENT_CACHE = TTLCache(maxsize=10_000, ttl=Config.CITATION_CACHE_TTL)
+_CHUNK_DOCUMENT_CACHE = TTLCache(maxsize=50_000, ttl=Config.CITATION_CACHE_TTL)
+_SOURCE_CITATION_CACHE = TTLCache(maxsize=10_000, ttl=Config.CITATION_CACHE_TTL)
+# Filenames with no fetched citation yet; kept briefly so new citations appear soon
+_SOURCE_MISS_CACHE = TTLCache(maxsize=10_000, ttl=min(300, Config.CITATION_CACHE_TTL))
+
+
+def invalidate_citation(document_id: int):
+    """Drop cached citation metadata after a document's citation changes."""
+    _DOCUMENT_CACHE.pop(document_id)
+    # Chunk and filename entries aren't indexed by document, so drop them all
+    _CHUNK_DOCUMENT_CACHE.clear()
+    _SOURCE_CITATION_CACHE.clear()
+    _SOURCE_MISS_CACHE.clear()
+
+
+# Documents still waiting for a citation. Failed fetches are retried after 24
+# hours plus up to two hours of per-document jitter (keyed on id, so it is
+# stable between polls), so a burst of failures doesn't retry all at once;
+# rows claimed by a fetcher that never reported back are reclaimed after an hour.
+PENDING_CITATION_FILTER = """
+    citation_fetched = FALSE
+    AND (
+        citation_fetch_attempted_at IS NULL
+        OR (citation_fetch_error IS NULL AND citation_fetch_attempted_at < NOW() - INTERVAL '1 hour')
+        OR citation_fetch_attempted_at < NOW() - INTERVAL '24 hours' - (id % 120) * INTERVAL '1 minute'
+    )
+"""
+
+
+def get_documents_without_citations(limit: int = 50) -> Iterator[Dict[str, Any]]:
+    """Yield documents that haven't had their citations fetched yet.
+    
+    Rows are streamed from a server-side cursor 500 at a time, so large limits
+    don't buffer the whole result. The pooled connection is held until the
+    generator is exhausted or closed.
+    """
     with get_db_connection() as conn:
-        with conn.cursor() as cursor:
+        with conn.cursor(name="documents_without_citations") as cursor:
+            cursor.itersize = 500
             cursor.execute(
-                """
+                f"""
                 SELECT id, filename, doi, file_path, created_at
                 FROM document 
-                WHERE citation_fetched = FALSE 
-                   AND (citation_fetch_error IS NULL OR citation_fetch_attempted_at < NOW() - INTERVAL '24 hours')
+                WHERE {PENDING_CITATION_FILTER}
                 ORDER BY created_at DESC
                 LIMIT %s
                 """,
                 (limit,)
             )
+            columns = None
+            for row in cursor:
+                # A named cursor only has a description after the first fetch
+                if columns is None:
+                    columns = tuple(desc[0] for desc in cursor.description)
+                yield dict(zip(columns, row))
+
+
+def count_documents_without_citations() -> int:
+    """Count all documents still waiting for a citation."""
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM document WHERE {PENDING_CITATION_FILTER}")
+            return cursor.fetchone()[0]
+
+
+def claim_documents_for_citation(limit: int = 50) -> List[Dict[str, Any]]:
+    """Claim a batch of pending documents for citation fetching.
+    
+    Stamps citation_fetch_attempted_at on the claimed rows in the same statement
+    that selects them, and skips rows locked by another fetcher, so concurrent
+    fetchers never work on the same document.
+    """
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE document SET
+                    citation_fetch_attempted_at = NOW(),
+                    citation_fetch_error = NULL
+                WHERE id IN (
+                    SELECT id
+                    FROM document
+                    WHERE {PENDING_CITATION_FILTER}
+                    ORDER BY created_at DESC
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, filename, doi
+                """,
+                (limit,)
+            )
             rows = cursor.fetchall()
-            columns = [desc[0] for desc in cursor.description]
+            columns = tuple(desc[0] for desc in cursor.description)
+            conn.commit()
             return [dict(zip(columns, row)) for row in rows]
 
 
-def update_document_citation_metadata(
+def finalize_citation_fetch(
     document_id: int,
-    citation_reference: str
+    reference: Optional[str] = None,
+    error: Optional[str] = None
 ) -> bool:
-    """Update document with fetched citation reference."""
+    """Record the outcome of one citation fetch in a single UPDATE.
+    
+    A reference marks the citation as fetched; without one the error is recorded
+    and the document stays pending until its retry window passes. This is the
+    one-document form of the reference_updates in store_citation_results.
+    """
     with get_db_connection() as conn:
         with conn.cursor() as cursor:
             try:
                 cursor.execute(
                     """
                     UPDATE document SET
-                        reference = %s,
-                        citation_fetched = TRUE,
+                        reference = COALESCE(%(reference)s, reference),
+                        citation_fetched = (%(reference)s IS NOT NULL),
                         citation_fetch_attempted_at = NOW(),
-                        citation_fetch_error = NULL,
+                        citation_fetch_error = %(error)s,
                         updated_at = NOW()
-                    WHERE id = %s
+                    WHERE id = %(id)s
                     """,
-                    (citation_reference, document_id)
+                    {"id": document_id, "reference": reference, "error": error}
                 )
                 conn.commit()
+                invalidate_citation(document_id)
                 return cursor.rowcount > 0
             except Exception as e:
-                print(f"Error updating document {document_id}: {e}")
+                print(f"Error finalizing citation fetch for document {document_id}: {e}")
                 conn.rollback()
                 return False
 
 
+def update_document_citation_metadata(
+    document_id: int,
+    citation_reference: str
+) -> bool:
+    """Update document with fetched citation reference."""
+    return finalize_citation_fetch(document_id, reference=citation_reference)
+
+
 def mark_citation_fetch_failed(document_id: int, error_message: str) -> bool:
     """Mark a document as having failed citation fetch."""
+    return finalize_citation_fetch(document_id, error=error_message)
+
+
+def store_citation_results(
+    doi_updates: List[Tuple[int, str]],
+    reference_updates: List[Tuple[int, Optional[str], Optional[str]]],
+    cache_entries: Optional[List[Tuple[str, str]]] = None
+) -> bool:
+    """Write a batch of citation fetch outcomes in one transaction.
+    
+    doi_updates holds (document_id, doi) pairs for DOIs derived from filenames.
+    reference_updates holds (document_id, reference, error) rows; a row with a
+    reference marks the citation as fetched, otherwise the error is recorded.
+    cache_entries holds (normalized_doi, citation) pairs for citation_cache.
+    """
+    if not doi_updates and not reference_updates and not cache_entries:
+        return True
+    
     with get_db_connection() as conn:
         with conn.cursor() as cursor:
             try:
-                cursor.execute(
-                    """
-                    UPDATE document SET
-                        citation_fetch_attempted_at = NOW(),
-                        citation_fetch_error = %s
-                    WHERE id = %s
-                    """,
-                    (error_message, document_id)
-                )
+                # Everything written here can be re-fetched, so don't wait on the
+                # WAL flush; a crash at worst re-queues the batch.
+                cursor.execute("SET LOCAL synchronous_commit = off")
+                
+                if cache_entries:
+                    execute_values(
+                        cursor,
+                        """
+                        INSERT INTO citation_cache (doi, citation, fetched_at)
+                        VALUES %s
+                        ON CONFLICT (doi) DO UPDATE SET
+                            citation = EXCLUDED.citation,
+                            fetched_at = EXCLUDED.fetched_at
+                        """,
+                        cache_entries,
+                        template="(%s, %s, NOW())"
+                    )
+                
+                if doi_updates:
+                    execute_values(
+                        cursor,
+                        """
+                        UPDATE document AS d SET
+                            doi = v.doi,
+                            updated_at = NOW()
+                        FROM (VALUES %s) AS v(id, doi)
+                        WHERE d.id = v.id
+                        """,
+                        doi_updates
+                    )
+                
+                if reference_updates:
+                    execute_values(
+                        cursor,
+                        """
+                        UPDATE document AS d SET
+                            reference = COALESCE(v.reference, d.reference),
+                            citation_fetched = (v.reference IS NOT NULL),
+                            citation_fetch_attempted_at = NOW(),
+                            citation_fetch_error = v.error,
+                            updated_at = NOW()
+                        FROM (VALUES %s) AS v(id, reference, error)
+                        WHERE d.id = v.id
+                        """,
+                        reference_updates,
+                        template="(%s, %s::text, %s::text)"
+                    )
+                
                 conn.commit()
-                return cursor.rowcount > 0
+                for document_id in {row[0] for row in doi_updates} | {row[0] for row in reference_updates}:
+                    invalidate_citation(document_id)
+                return True
             except Exception as e:
-                print(f"Error marking citation fetch failed for document {document_id}: {e}")
+                print(f"Error storing citation results: {e}")
                 conn.rollback()
                 return False
 
 
 def get_document_by_chunk_id(chunk_id: int) -> Optional[Dict[str, Any]]:
-    """Get document metadata by chunk ID."""
-    with get_db_connection() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT d.id, d.filename, d.doi, d.reference, d.citation_fetched
-                FROM document d
-                JOIN document_chunks dc ON dc.document_id = d.id
-                WHERE dc.id = %s
-                """,
-                (chunk_id,)
-            )
-            row = cursor.fetchone()
-            if row:
-                columns = [desc[0] for desc in cursor.description]
-                return dict(zip(columns, row))
-            return None
+    """Get document metadata by chunk ID.
+    
+    Deprecated: call get_documents_for_chunks once with every chunk ID instead
+    of calling this per chunk.
+    """
+    warnings.warn(
+        "get_document_by_chunk_id is deprecated; use get_documents_for_chunks",
+        DeprecationWarning,
+        stacklevel=2
+    )
+    return get_documents_for_chunks([chunk_id]).get(chunk_id)
+
+
+# Hot read paths, run as per-connection prepared statements ($n placeholders)
+DOCUMENTS_FOR_CHUNKS_SQL = """
+    SELECT dc.id as chunk_id, d.id, d.filename, d.file_path, d.doi, d.reference, d.citation_fetched
+    FROM document d
+    JOIN document_chunks dc ON dc.document_id = d.id
+    WHERE dc.id = ANY($1::int[])
+"""
+
+# Same lookup joined against a VALUES list, which plans better than ANY for
+# very long id lists (used above LARGE_ID_LIST)
+DOCUMENTS_FOR_CHUNK_VALUES_SQL = """
+    SELECT dc.id as chunk_id, d.id, d.filename, d.file_path, d.doi, d.reference, d.citation_fetched
+    FROM (VALUES %s) AS v(chunk_id)
+    JOIN document_chunks dc ON dc.id = v.chunk_id
+    JOIN document d ON d.id = dc.document_id
+"""
+LARGE_ID_LIST = 1000
+
+DOCUMENTS_BY_IDS_SQL = """
+    SELECT id, file_path, doi, reference, citation_fetched
+    FROM document
+    WHERE id = ANY($1::int[])
+"""
+
+CITATION_FOR_SOURCE_SQL = """
+    SELECT reference
+    FROM document 
+    WHERE filename = $1 AND citation_fetched = TRUE
+    LIMIT 1
+"""
+
+CITATIONS_FOR_SOURCES_SQL = """
+    SELECT DISTINCT ON (filename) filename, reference
+    FROM document 
+    WHERE filename = ANY($1::text[]) AND citation_fetched = TRUE
+    ORDER BY filename, id
+"""
 
 
 def get_documents_for_chunks(chunk_ids: List[int]) -> Dict[int, Dict[str, Any]]:
@@ -109,24 +318,34 @@ def get_documents_for_chunks(chunk_ids: List[int]) -> Dict[int, Dict[str, Any]]:
     if not chunk_ids:
         return {}
     
+    results = {}
+    missing = []
+    for chunk_id in dict.fromkeys(chunk_ids):
+        cached = _CHUNK_DOCUMENT_CACHE.get(chunk_id)
+        if cached is not None:
+            results[chunk_id] = dict(cached)
+        else:
+            missing.append(chunk_id)
+    if not missing:
+        return results
+    
     with get_db_connection() as conn:
         with conn.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT dc.id as chunk_id, d.id, d.file_path, d.doi, d.reference, d.citation_fetched
-                FROM document d
-                JOIN document_chunks dc ON dc.document_id = d.id
-                WHERE dc.id = ANY(%s)
-                """,
-                (chunk_ids,)
-            )
+            if len(missing) > LARGE_ID_LIST:
+                rows = execute_values(
+                    cursor, DOCUMENTS_FOR_CHUNK_VALUES_SQL, [(chunk_id,) for chunk_id in missing],
+                    page_size=len(missing), fetch=True
+                )
+            else:
+                execute_prepared(cursor, "documents_for_chunks", DOCUMENTS_FOR_CHUNKS_SQL, (missing,))
+                rows = cursor.fetchall()
             
-            results = {}
-            columns = [desc[0] for desc in cursor.description]
-            for row in cursor.fetchall():
-                row_dict = dict(zip(columns, row))
-                chunk_id = row_dict.pop('chunk_id')
-                results[chunk_id] = row_dict
+            # Column names once per query; the leading chunk_id keys the result
+            columns = tuple(desc[0] for desc in cursor.description[1:])
+            for chunk_id, *values in rows:
+                row_dict = dict(zip(columns, values))
+                _CHUNK_DOCUMENT_CACHE.set(chunk_id, row_dict)
+                results[chunk_id] = dict(row_dict)
             
             return results
 
@@ -136,42 +355,176 @@ def get_documents_by_ids(document_ids: List[int]) -> Dict[int, Dict[str, Any]]:
     if not document_ids:
         return {}
     
+    results = {}
+    missing = []
+    for doc_id in dict.fromkeys(document_ids):
+        cached = _DOCUMENT_CACHE.get(doc_id)
+        if cached is not None:
+            results[doc_id] = dict(cached)
+        else:
+            missing.append(doc_id)
+    if not missing:
+        return results
+    
     with get_db_connection() as conn:
         with conn.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT id, file_path, doi, reference, citation_fetched
-                FROM document
-                WHERE id = ANY(%s)
-                """,
-                (document_ids,)
-            )
+            execute_prepared(cursor, "documents_by_ids", DOCUMENTS_BY_IDS_SQL, (missing,))
             
-            results = {}
-            columns = [desc[0] for desc in cursor.description]
+            columns = tuple(desc[0] for desc in cursor.description)
             for row in cursor.fetchall():
                 row_dict = dict(zip(columns, row))
                 doc_id = row_dict['id']
-                results[doc_id] = row_dict
+                _DOCUMENT_CACHE.set(doc_id, row_dict)
+                results[doc_id] = dict(row_dict)
             
             return results
 
 
 def get_citation_for_source(source_filename: str) -> Optional[str]:
     """Get formatted citation for a source filename."""
+    cached = _SOURCE_CITATION_CACHE.get(source_filename)
+    if cached is not None:
+        return cached
+    if _SOURCE_MISS_CACHE.get(source_filename):
+        return None
+    
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            execute_prepared(cursor, "citation_for_source", CITATION_FOR_SOURCE_SQL, (source_filename,))
+            row = cursor.fetchone()
+            if row and row[0] is not None:
+                _SOURCE_CITATION_CACHE.set(source_filename, row[0])
+                return row[0]  # Return the reference (APA citation from doi.org)
+            
+            _SOURCE_MISS_CACHE.set(source_filename, True)
+            return None
+
+
+
+def get_citations_for_sources(source_filenames: List[str]) -> Dict[str, str]:
+    """Get formatted citations for several source filenames in one query."""
+    results = {}
+    missing = []
+    for filename in dict.fromkeys(source_filenames):
+        cached = _SOURCE_CITATION_CACHE.get(filename)
+        if cached is not None:
+            results[filename] = cached
+        elif not _SOURCE_MISS_CACHE.get(filename):
+            missing.append(filename)
+    if not missing:
+        return results
+    
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            execute_prepared(cursor, "citations_for_sources", CITATIONS_FOR_SOURCES_SQL, (missing,))
+            found = dict(cursor.fetchall())
+    
+    for filename in missing:
+        reference = found.get(filename)
+        if reference is not None:
+            _SOURCE_CITATION_CACHE.set(filename, reference)
+            results[filename] = reference
+        else:
+            _SOURCE_MISS_CACHE.set(filename, True)
+    return results
+
+
+def get_cached_citation(doi: str) -> Optional[str]:
+    """Get a previously fetched citation for a normalized DOI."""
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT citation FROM citation_cache WHERE doi = %s",
+                (doi,)
+            )
+            row = cursor.fetchone()
+            return row[0] if row else None
+
+
+def get_cached_citations(dois: List[str]) -> Dict[str, str]:
+    """Get previously fetched citations for many normalized DOIs in one query."""
+    if not dois:
+        return {}
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT doi, citation FROM citation_cache WHERE doi = ANY(%s)",
+                (list(dois),)
+            )
+            return dict(cursor.fetchall())
+
+
+def save_cached_citation(doi: str, citation: str) -> bool:
+    """Store a fetched citation under its normalized DOI."""
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            try:
+                cursor.execute(
+                    """
+                    INSERT INTO citation_cache (doi, citation, fetched_at)
+                    VALUES (%s, %s, NOW())
+                    ON CONFLICT (doi) DO UPDATE SET
+                        citation = EXCLUDED.citation,
+                        fetched_at = EXCLUDED.fetched_at
+                    """,
+                    (doi, citation)
+                )
+                conn.commit()
+                return True
+            except Exception as e:
+                print(f"Error caching citation for DOI {doi}: {e}")
+                conn.rollback()
+                return False
+
+
+def document_trigger_exists(trigger_name: str) -> bool:
+    """Whether the named trigger is installed on the document table."""
     with get_db_connection() as conn:
         with conn.cursor() as cursor:
             cursor.execute(
                 """
-                SELECT reference
-                FROM document 
-                WHERE filename = %s AND citation_fetched = TRUE
-                LIMIT 1
+                SELECT EXISTS (
+                    SELECT 1 FROM pg_trigger
+                    WHERE tgrelid = 'document'::regclass
+                      AND tgname = %s
+                      AND NOT tgisinternal
+                )
                 """,
-                (source_filename,)
+                (trigger_name,)
             )
-            row = cursor.fetchone()
-            if row:
-                return row[0]  # Return the reference (APA citation from doi.org)
-            
-            return None
\ No newline at end of file
+            return cursor.fetchone()[0]
+
+
+def open_listen_connection(channel: str):
+    """Open an autocommit connection subscribed to a NOTIFY channel."""
+    conn = open_dedicated_connection()
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute(f"LISTEN {channel}")
+    return conn
+
+
+def try_advisory_lock(name: str):
+    """Try to take a session-level advisory lock named `name`.
+    
+    Returns the connection holding the lock, or None if another session holds
+    it. The lock lives as long as the connection; pass it to
+    release_advisory_lock when done.
+    """
+    conn = open_dedicated_connection()
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (name,))
+        if cursor.fetchone()[0]:
+            return conn
+    conn.close()
+    return None
+
+
+def release_advisory_lock(conn, name: str):
+    """Release a lock taken with try_advisory_lock and close its connection."""
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(hashtext(%s))", (name,))
+    finally:
+        conn.close()
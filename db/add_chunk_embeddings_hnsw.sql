@@ -0,0 +1,8 @@
+-- HNSW index for chunk retrieval. Unlike the ivfflat index from init.sql it
+-- needs no training data, so it also works on a database that was empty when
+-- the index was built; vector_search sets hnsw.ef_search per query.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chunk_embeddings_hnsw
+    ON chunk_embeddings USING hnsw (embedding_vector vector_cosine_ops)
+    WITH (m = 16, ef_construction = 64);
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_chunk_embeddings_vector;
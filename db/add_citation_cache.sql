@@ -0,0 +1,6 @@
+-- Persistent DOI -> formatted citation cache shared by all citation fetchers
+CREATE TABLE IF NOT EXISTS citation_cache (
+    doi VARCHAR(255) PRIMARY KEY,  -- Normalized (lower-case, no resolver prefix)
+    citation TEXT NOT NULL,        -- APA-formatted citation from doi.org citation API
+    fetched_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,18 @@
+-- Wake citation fetchers (LISTEN citation_pending) when a document needing a
+-- citation is added. Apply after add_document_table.sql.
+CREATE OR REPLACE FUNCTION notify_citation_pending()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.citation_fetched = FALSE THEN
+        PERFORM pg_notify('citation_pending', NEW.id::text);
+    END IF;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS notify_citation_pending ON document;
+
+CREATE TRIGGER notify_citation_pending
+    AFTER INSERT ON document
+    FOR EACH ROW
+    EXECUTE FUNCTION notify_citation_pending();
@@ -0,0 +1,12 @@
+-- Partial indexes for the citation lookups in api_service/utils/document_db.py.
+-- Apply after add_document_table.sql. CONCURRENTLY keeps document writable
+-- while building on a live database.
+
+-- Citation fetcher queue: WHERE citation_fetched = FALSE ... ORDER BY created_at DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_document_needs_citation
+    ON document (created_at DESC) WHERE citation_fetched = FALSE;
+
+-- Source citations: WHERE filename = ANY(...) AND citation_fetched = TRUE,
+-- with DISTINCT ON (filename) ... ORDER BY filename, id
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_document_filename_fetched
+    ON document (filename, id) WHERE citation_fetched = TRUE;
@@ -0,0 +1,5 @@
+-- Favorites listing: WHERE is_favorite = true ORDER BY created_at DESC.
+-- Partial, so only favorited rows are indexed. The per-query lookups use the
+-- unique index from add_user_feedback_unique_query.sql.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_feedback_fav_created
+    ON user_feedback (created_at DESC, id DESC) WHERE is_favorite = TRUE;
@@ -0,0 +1,11 @@
+-- Expression indexes backing the /ingestion/quality JSONB filters and group-bys.
+-- CONCURRENTLY keeps document_chunks writable while building on a live database.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_dc_content_hash
+    ON document_chunks ((source_metadata->>'content_hash'));
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_dc_source
+    ON document_chunks ((source_metadata->>'source'));
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_dc_ocr
+    ON document_chunks ((source_metadata->>'source'))
+    WHERE source_metadata->>'ocr_applied' = 'true';
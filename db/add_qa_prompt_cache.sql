@@ -0,0 +1,15 @@
+-- Cached scores for LLM classification / verification prompts.
+-- Exact hits go through prompt_hash; paraphrased questions about the same chunk
+-- are matched by cosine similarity of the question embedding within that chunk's
+-- rows, so a plain btree on chunk_id narrows the search better than an ANN index.
+CREATE TABLE IF NOT EXISTS qa_prompt_cache (
+    prompt_hash BYTEA PRIMARY KEY,
+    kind TEXT NOT NULL,
+    chunk_id INTEGER,
+    embedding VECTOR(1536),
+    score DOUBLE PRECISION NOT NULL,
+    model TEXT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_qa_prompt_cache_chunk ON qa_prompt_cache(chunk_id, model) WHERE chunk_id IS NOT NULL;
@@ -0,0 +1,7 @@
+-- Embeddings of previously seen queries, keyed by SHA-256 of the normalized
+-- query text, so repeated queries skip the OpenAI embedding call.
+CREATE TABLE IF NOT EXISTS query_embedding_cache (
+    query_hash BYTEA PRIMARY KEY,
+    embedding VECTOR(1536) NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
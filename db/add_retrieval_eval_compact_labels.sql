@@ -0,0 +1,24 @@
+-- Narrow the per-judgment label and rank columns to SMALLINT (2 bytes instead of 4).
+-- relevance_score stays an integer type so existing AVG()/= 1 queries are unchanged.
+-- The summary view depends on both columns, so it is rebuilt around the ALTER.
+BEGIN;
+
+DROP MATERIALIZED VIEW IF EXISTS retrieval_eval_summary;
+
+ALTER TABLE retrieval_evaluations
+    ALTER COLUMN relevance_score TYPE SMALLINT,
+    ALTER COLUMN rank_position TYPE SMALLINT;
+
+CREATE MATERIALIZED VIEW retrieval_eval_summary AS
+SELECT
+    1 AS id,
+    COUNT(*) FILTER (WHERE relevance_score = 1) AS relevant,
+    COUNT(*) AS total,
+    AVG(CASE WHEN rank_position <= 5 THEN relevance_score END)::float AS p5,
+    AVG(CASE WHEN rank_position <= 10 THEN relevance_score END)::float AS p10,
+    NOW() AS refreshed_at
+FROM retrieval_evaluations;
+
+CREATE UNIQUE INDEX idx_retrieval_eval_summary_id ON retrieval_eval_summary(id);
+
+COMMIT;
@@ -0,0 +1,15 @@
+-- Precomputed retrieval-evaluation summary for /retrieval/eval/summary.
+-- The API refreshes it when older than a minute; with pg_cron available it can
+-- be scheduled instead:
+--   SELECT cron.schedule('* * * * *', 'REFRESH MATERIALIZED VIEW CONCURRENTLY retrieval_eval_summary');
+CREATE MATERIALIZED VIEW IF NOT EXISTS retrieval_eval_summary AS
+SELECT
+    1 AS id,  -- Single-row key required by REFRESH ... CONCURRENTLY
+    COUNT(*) FILTER (WHERE relevance_score = 1) AS relevant,
+    COUNT(*) AS total,
+    AVG(CASE WHEN rank_position <= 5 THEN relevance_score END)::float AS p5,
+    AVG(CASE WHEN rank_position <= 10 THEN relevance_score END)::float AS p10,
+    NOW() AS refreshed_at
+FROM retrieval_evaluations;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_retrieval_eval_summary_id ON retrieval_eval_summary(id);
@@ -0,0 +1,8 @@
+-- One feedback row per cached query, so saves can upsert with ON CONFLICT (query_cache_id).
+-- Duplicates could only come from concurrent first saves; keep the oldest row of each.
+DELETE FROM user_feedback a
+USING user_feedback b
+WHERE a.query_cache_id = b.query_cache_id
+  AND a.id > b.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_user_feedback_query_cache_id ON user_feedback(query_cache_id);
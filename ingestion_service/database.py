@@ -1,15 +1,72 @@
 """Database operations for the ingestion service."""
 
+import io
 import os
+import csv
+import threading
+from contextlib import contextmanager
 import psycopg2
-from psycopg2.extras import execute_values
+from psycopg2.extras import execute_values, Json
+from psycopg2.pool import ThreadedConnectionPool
 import json
-from config import DB_URL
+from config import DB_URL, DB_POOL_MIN_CONNECTIONS, DB_POOL_MAX_CONNECTIONS
 
+try:
+    import numpy as np
+    from pgvector.psycopg2 import register_vector
+    PGVECTOR_AVAILABLE = True
+except ImportError:
+    PGVECTOR_AVAILABLE = False
 
+_pool = None
+_pool_lock = threading.Lock()
+# Blocks callers while every pooled connection is checked out, instead of
+# ThreadedConnectionPool raising PoolError
+_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX_CONNECTIONS)
+
+
+class _VectorConnectionPool(ThreadedConnectionPool):
+    """Registers the pgvector binary adapter on every new pooled connection."""
+    
+    def _connect(self, key=None):
+        conn = super()._connect(key)
+        if PGVECTOR_AVAILABLE:
+            register_vector(conn)
+            conn.commit()
+        return conn
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = _VectorConnectionPool(DB_POOL_MIN_CONNECTIONS, DB_POOL_MAX_CONNECTIONS, DB_URL)
+    return _pool
+
+
+def _vector_param(embedding):
+    """Embedding as a float32 array for the pgvector adapter, or its text literal without it."""
+    if PGVECTOR_AVAILABLE:
+        return np.asarray(embedding, dtype=np.float32)
+    return '[' + ','.join(map(str, embedding)) + ']'
+
+
+@contextmanager
 def get_db_connection():
-    """Get a database connection."""
-    return psycopg2.connect(DB_URL)
+    """Borrow a pooled connection for the duration of a ``with`` block.
+    
+    The transaction is committed on success and rolled back on error, as with
+    ``with psycopg2.connect(...)``, and the connection is then returned to the pool.
+    """
+    pool = _get_pool()
+    with _pool_slots:
+        conn = pool.getconn()
+        try:
+            with conn:
+                yield conn
+        finally:
+            pool.putconn(conn, close=bool(conn.closed))
 
 
 def check_document_exists(content_hash):
@@ -18,12 +75,82 @@ def check_document_exists(content_hash):
         with conn.cursor() as cursor:
             cursor.execute(
                 """
-                SELECT COUNT(*) FROM document 
-                WHERE content_hash = %s
+                SELECT EXISTS (
+                    SELECT 1 FROM document
+                    WHERE content_hash = %s
+                )
                 """, 
                 (content_hash,)
             )
-            return cursor.fetchone()[0] > 0
+            return cursor.fetchone()[0]
+
+
+
+def check_documents_exist(content_hashes):
+    """Return the subset of content hashes that already have a document, in one query."""
+    content_hashes = list(set(content_hashes))
+    if not content_hashes:
+        return set()
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT DISTINCT content_hash FROM document
+                WHERE content_hash = ANY(%s)
+                """,
+                (content_hashes,)
+            )
+            return {row[0] for row in cursor.fetchall()}
+
+
+class _SharedJson(Json):
+    """Json parameter repeated across many rows, encoded and quoted only once.
+    
+    Every chunk of a document carries the same metadata, so the adapter is built
+    once per document and reused for each row; ``encoded`` is the JSON text.
+    """
+    
+    def __init__(self, adapted):
+        super().__init__(adapted)
+        # Compact, since jsonb re-parses it anyway
+        self.encoded = json.dumps(adapted, ensure_ascii=False, separators=(",", ":"))
+        self._quoted = None
+    
+    def dumps(self, obj):
+        return self.encoded
+    
+    def getquoted(self):
+        if self._quoted is None:
+            self._quoted = super().getquoted()
+        return self._quoted
+
+
+# Documents with more chunks than this are loaded with COPY instead of INSERT
+COPY_CHUNKS_THRESHOLD = 1000
+
+
+def _copy_chunks(cursor, chunk_rows):
+    """Load (text, metadata, document_id) rows with COPY and return their ids.
+    
+    COPY has no RETURNING, so the ids are drawn from the table's sequence first
+    and written explicitly, keeping them in chunk_rows order.
+    """
+    cursor.execute(
+        "SELECT nextval(pg_get_serial_sequence('document_chunks', 'id')) FROM generate_series(1, %s)",
+        (len(chunk_rows),)
+    )
+    chunk_ids = [row[0] for row in cursor.fetchall()]
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    for chunk_id, (text, metadata, document_id) in zip(chunk_ids, chunk_rows):
+        writer.writerow((chunk_id, text, metadata.encoded, document_id))
+    buffer.seek(0)
+    cursor.copy_expert(
+        "COPY document_chunks (id, text_content, source_metadata, document_id) FROM STDIN WITH (FORMAT csv)",
+        buffer
+    )
+    return chunk_ids
 
 
 def store_document_and_chunks(chunks_data, embeddings_data, metadata, *, chunk_evaluations=None):
@@ -50,9 +177,8 @@ def store_document_and_chunks(chunks_data, embeddings_data, metadata, *, chunk_e
             if 'doi' in metadata:
                 doi = metadata['doi']
             elif 'source' in metadata:
-                from metadata_extractor import MetadataExtractor
-                extractor = MetadataExtractor()
-                doi = extractor.extract_doi_from_filename(metadata['source'])
+                from metadata_extractor import DEFAULT_EXTRACTOR
+                doi = DEFAULT_EXTRACTOR.extract_doi_from_filename(metadata['source'])
             
             cursor.execute(
                 """
@@ -74,37 +200,37 @@ def store_document_and_chunks(chunks_data, embeddings_data, metadata, *, chunk_e
             )
             document_id = cursor.fetchone()[0]
             
-            # Insert chunks and reference the document
-            chunk_ids = []
+            # Insert chunks and reference the document, skipping empty ones
+            metadata_param = _SharedJson(metadata)
+            chunk_rows = []
             for chunk_text in chunks_data:
                 # Ensure chunk text is clean
                 clean_text = chunk_text.replace('\x00', '')
-                # Skip empty chunks
-                if not clean_text.strip():
-                    continue
-                
-                cursor.execute(
-                    """
-                    INSERT INTO document_chunks (text_content, source_metadata, document_id) 
-                    VALUES (%s, %s, %s) RETURNING id
-                    """,
-                    (clean_text, json.dumps(metadata), document_id)
+                if clean_text.strip():
+                    chunk_rows.append((clean_text, metadata_param, document_id))
+            
+            chunk_ids = []
+            if len(chunk_rows) > COPY_CHUNKS_THRESHOLD:
+                chunk_ids = _copy_chunks(cursor, chunk_rows)
+            elif chunk_rows:
+                # RETURNING yields ids in VALUES order, so they line up with chunk_rows
+                returned = execute_values(
+                    cursor,
+                    "INSERT INTO document_chunks (text_content, source_metadata, document_id) VALUES %s RETURNING id",
+                    chunk_rows,
+                    page_size=500,
+                    fetch=True
                 )
-                chunk_id = cursor.fetchone()[0]
-                chunk_ids.append(chunk_id)
+                chunk_ids = [row[0] for row in returned]
             
             # Store embeddings if we have any
             if embeddings_data and len(embeddings_data) == len(chunk_ids):
-                embedding_values = []
-                for chunk_id, embedding in zip(chunk_ids, embeddings_data):
-                    # Convert embedding list to pgvector format
-                    embedding_str = '[' + ','.join(map(str, embedding)) + ']'
-                    embedding_values.append((chunk_id, embedding_str))
-                
                 execute_values(
                     cursor,
                     "INSERT INTO chunk_embeddings (chunk_id, embedding_vector) VALUES %s",
-                    [(chunk_id, f"{emb}") for chunk_id, emb in embedding_values]
+                    [(chunk_id, _vector_param(embedding)) for chunk_id, embedding in zip(chunk_ids, embeddings_data)],
+                    template="(%s, %s::vector)",
+                    page_size=200
                 )
             
             # Store chunk evaluations if provided
@@ -13,7 +13,7 @@ from database import check_document_exists, store_document_and_chunks
 from embeddings import create_embeddings_batch
 from academic_processor import is_academic_paper, process_academic_paper
 from evaluators import ChunkQualityEvaluator
-from metadata_extractor import MetadataExtractor
+from metadata_extractor import DEFAULT_EXTRACTOR
 
 
 def process_document(file_path):
@@ -82,7 +82,7 @@ def process_document(file_path):
             return
         
         # Enhanced metadata extraction
-        metadata_extractor = MetadataExtractor()
+        metadata_extractor = DEFAULT_EXTRACTOR
         
         # Extract comprehensive metadata from content
         enhanced_metadata = metadata_extractor.extract_metadata_from_text(content, file_name)
@@ -33,23 +33,32 @@ def create_embedding(text):
         return [0.0] * 1536
 
 
-def create_embeddings_batch(texts):
+def create_embeddings_batch(texts, batch_size=256):
     """Create embeddings for a batch of texts.
     
+    Texts are sent `batch_size` at a time in a single embeddings request;
+    a slice that fails is retried one text at a time.
+    
     Args:
         texts: List of text strings
+        batch_size: Number of texts per API request (kept well under the
+            per-request token cap for full-size chunks)
         
     Returns:
         List of embedding lists
     """
     embeddings = []
-    for text in texts:
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
         try:
-            embedding = create_embedding(text)
-            embeddings.append(embedding)
+            response = client.embeddings.create(
+                input=batch,
+                model="text-embedding-ada-002"
+            )
+            embeddings.extend(item.embedding for item in response.data)
+            time.sleep(RATE_LIMIT_DELAY)
         except Exception as e:
-            print(f"Error creating embedding for text batch: {e}")
-            # Add default embedding for this text
-            embeddings.append([0.0] * 1536)
+            print(f"Error creating embeddings for text batch, embedding individually: {e}")
+            embeddings.extend(create_embedding(text) for text in batch)
     
-    return embeddings
\ No newline at end of file
+    return embeddings
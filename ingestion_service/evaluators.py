@@ -1,6 +1,12 @@
 import re
 from typing import Dict
 
+# Characters that are neither word characters, whitespace nor common punctuation
+_NON_WORD_RE = re.compile(r"[^\w\s.,;:()\-]")
+# The same class over ASCII bytes, as a deletion table for bytes.translate:
+# deleting every allowed byte leaves only the non-word ones to count
+_ALLOWED_ASCII = bytes(b for b in range(128) if not _NON_WORD_RE.match(chr(b)))
+
 class ChunkQualityEvaluator:
     """Lightweight heuristic evaluator for chunk quality.
     Replaces NUL-heavy or empty/garbage chunks and flags issues.
@@ -9,16 +15,21 @@ class ChunkQualityEvaluator:
     def __init__(self):
         self.min_characters = 40
 
+    def _count_non_word(self, text: str) -> int:
+        if text.isascii():
+            return len(text.encode("ascii").translate(None, _ALLOWED_ASCII))
+        return sum(1 for _ in _NON_WORD_RE.finditer(text))
+
     def evaluate_chunk(self, chunk: str) -> Dict[str, object]:
         text = chunk or ""
-        has_content = len(text.strip()) >= self.min_characters
+        stripped = text.strip()
+        has_content = len(stripped) >= self.min_characters
         # Detect excessive non-word characters
         non_word_ratio = 0.0
         if text:
-            non_word_chars = len(re.findall(r"[^\w\s.,;:()\-]", text))
-            non_word_ratio = non_word_chars / max(1, len(text))
+            non_word_ratio = self._count_non_word(text) / len(text)
         formatting_artifacts = non_word_ratio > 0.15
-        grammatically_complete = text.strip().endswith(('.', '!', '?')) or len(text.split()) > 12
+        grammatically_complete = stripped.endswith(('.', '!', '?')) or len(text.split()) > 12
 
         # Binary score: 1 if passes all checks, else 0
         passes = int(has_content and not formatting_artifacts and grammatically_complete)
@@ -1,12 +1,12 @@
 """File processing modules for different document types."""
 
 import os
-import pypdf
 import docx
 import magic
 from PIL import Image
 import pytesseract
 from pdf2image import convert_from_path
+from pdf_cache import get_pdf_reader
 
 
 def clean_text(text):
@@ -24,12 +24,11 @@ def clean_text(text):
 def is_pdf_searchable(file_path):
     """Check if a PDF contains searchable text."""
     try:
-        with open(file_path, 'rb') as file:
-            pdf_reader = pypdf.PdfReader(file)
-            # Check first few pages for text
-            for i in range(min(3, len(pdf_reader.pages))):
-                if pdf_reader.pages[i].extract_text().strip():
-                    return True
+        pdf_reader = get_pdf_reader(file_path)
+        # Check first few pages for text
+        for i in range(min(3, len(pdf_reader.pages))):
+            if pdf_reader.pages[i].extract_text().strip():
+                return True
         return False
     except Exception as e:
         print(f"Error checking if PDF is searchable: {e}")
@@ -64,17 +63,16 @@ def process_pdf_with_ocr(file_path):
 def process_pdf_without_ocr(file_path):
     """Process a PDF without OCR."""
     try:
-        with open(file_path, 'rb') as file:
-            pdf_reader = pypdf.PdfReader(file)
-            text = ""
-            for i, page in enumerate(pdf_reader.pages):
-                try:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += clean_text(page_text)
-                except Exception as e:
-                    print(f"Error extracting text from page {i+1}: {e}")
-            return text
+        pdf_reader = get_pdf_reader(file_path)
+        text = ""
+        for i, page in enumerate(pdf_reader.pages):
+            try:
+                page_text = page.extract_text()
+                if page_text:
+                    text += clean_text(page_text)
+            except Exception as e:
+                print(f"Error extracting text from page {i+1}: {e}")
+        return text
     except Exception as e:
         print(f"Error processing PDF without OCR: {e}")
         return ""
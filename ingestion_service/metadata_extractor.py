@@ -11,17 +11,32 @@ Extracts comprehensive metadata including:
 """
 
 import re
+import string
 import json
+from itertools import islice
 from typing import Dict, List, Optional, Any, Tuple
 from pathlib import Path
 import logging
 
 # Import PDF processing libraries with fallbacks
 try:
-    import PyPDF2
+    import pypdfium2 as pdfium
+    PDFIUM_AVAILABLE = True
+except ImportError:
+    PDFIUM_AVAILABLE = False
+
+try:
+    from pdf_cache import get_pdf_reader
     PDF_AVAILABLE = True
 except ImportError:
-    PDF_AVAILABLE = False
+    PDF_AVAILABLE = PDFIUM_AVAILABLE
+
+# RE2 scans in linear time, used for patterns that run over whole documents
+try:
+    import re2
+    RE2_AVAILABLE = True
+except ImportError:
+    RE2_AVAILABLE = False
 
 try:
     from bs4 import BeautifulSoup
@@ -31,24 +46,142 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Every pattern is compiled once at import, with its flags baked in.
+
+
+def _compile_scan(pattern: str, flags: int = 0):
+    """Compile a pattern that searches a whole document.
+
+    Uses RE2 when installed, so a long document can't trigger backtracking
+    blow-ups; RE2 takes flags inline. Falls back to `re` otherwise.
+    """
+    if RE2_AVAILABLE:
+        inline = ''.join(letter for flag, letter in
+                         ((re.IGNORECASE, 'i'), (re.MULTILINE, 'm'), (re.DOTALL, 's'))
+                         if flags & flag)
+        try:
+            return re2.compile(f'(?{inline}){pattern}' if inline else pattern)
+        except re2.error:
+            pass
+    return re.compile(pattern, flags)
+
+
+# DOI in any of its usual forms (bare, "doi:" prefix, doi.org / dx.doi.org URL),
+# with the DOI itself captured in the "doi" group
+_DOI_COMBINED = re.compile(
+    r'(?:doi:\s*|https?://(?:dx\.)?doi\.org/|dx\.doi\.org/)?(?P<doi>10\.\d{4,}[^\s<>\[\]\"\']*)',
+    re.IGNORECASE
+)
+_DOI_TRAIL = re.compile(r'[.,;:\s\[\]\"\'<>]+$')
+_DOI_VALID = re.compile(r'^10\.\d{4,}/')
+
+# Author patterns
+_AUTHOR_RES = [re.compile(p, re.MULTILINE) for p in (
+    r'(?:Authors?|By):\s*([^\n\r]+)',
+    r'(?:^|\n)\s*([A-Z][a-z]+(?:\s+[A-Z]\.?\s*)*[A-Z][a-z]+(?:\s*,\s*[A-Z][a-z]+(?:\s+[A-Z]\.?\s*)*[A-Z][a-z]+)*)',
+)]
+# Characters allowed in an author name, as a deletion table: a candidate is
+# valid if nothing but whitespace survives translate()
+_NAME_CHARS = {ord(c): None for c in string.ascii_letters + ".-'"}
+_SECTION_WORDS = ('abstract', 'introduction', 'keywords', 'doi')
+_SECTION_WORD_RE = re.compile(r'\b(?:abstract|introduction|keywords|doi)\b', re.IGNORECASE)
+_NAME_START_RE = re.compile(r'^[A-Z][a-z]+(?:\s+[A-Z]\.?)?\s+[A-Z][a-z]+')
+
+# Title patterns
+_NUMBER_LINE_RE = re.compile(r'^\d+$')
+_PAGE_LINE_RE = re.compile(r'^page\s+\d+', re.IGNORECASE)
+_ENUM_START_RE = re.compile(r'^\d+\.')
+_TITLE_LABEL_RE = _compile_scan(r'(?:^|\n)\s*(?:Title|TITLE):\s*([^\n\r]+)', re.MULTILINE)
+_UNDERSCORE_HYPHEN_RE = re.compile(r'[_-]+')
+_WHITESPACE_RE = re.compile(r'\s+')
+_FILENAME_YEAR_RE = re.compile(r'\d{4}[a-zA-Z]*\s*')
+
+# Year patterns, near publication-related keywords first
+_YEAR_RES = [re.compile(p, re.IGNORECASE | re.MULTILINE) for p in (
+    r'(?:published|copyright|©)\s*(?:in\s*)?(\d{4})',
+    r'(\d{4})\s*(?:all rights reserved|copyright|©)',
+    r'(?:^|\n)\s*(\d{4})\s*(?:\n|$)',  # Year on its own line
+    r'\b(19\d{2}|20[0-2]\d)\b',  # General 4-digit year pattern
+)]
+_PDF_DATE_YEAR_RE = re.compile(r'(\d{4})')
+
+# Abstract section pattern (case-insensitive, so one spelling covers
+# ABSTRACT/Abstract/abstract)
+_ABSTRACT_RE = _compile_scan(
+    r'(?:^|\n)\s*abstract\s*:?\s*\n(.*?)(?:\n\s*(?:keywords?|introduction|1\.|i\.|\n\s*\n))',
+    re.DOTALL | re.IGNORECASE
+)
+
+# Keywords section patterns
+_KEYWORD_RES = [_compile_scan(p, re.IGNORECASE | re.MULTILINE) for p in (
+    r'(?:^|\n)\s*KEYWORDS?\s*:?\s*([^\n]+)',
+    r'(?:^|\n)\s*Keywords?\s*:?\s*([^\n]+)',
+    r'(?:^|\n)\s*Key\s*words?\s*:?\s*([^\n]+)',
+)]
+_KEYWORD_SPLIT_RE = re.compile(r'[,;]\s*')
+
+# Journal name, volume, issue and pages patterns
+_JOURNAL_RES = [re.compile(p, re.IGNORECASE | re.MULTILINE) for p in (
+    r'(?:^|\n)\s*([A-Z][^.\n]+Journal[^.\n]*)',
+    r'(?:^|\n)\s*([A-Z][^.\n]+Review[^.\n]*)',
+    r'(?:^|\n)\s*([A-Z][^.\n]+Proceedings[^.\n]*)',
+    r'(?:Published in|Appears in):\s*([^\n]+)',
+)]
+_VOLUME_RE = re.compile(r'(?:Vol\.|Volume)\s*(\d+)', re.IGNORECASE)
+_ISSUE_RE = re.compile(r'(?:No\.|Issue)\s*(\d+)', re.IGNORECASE)
+_PAGES_RE = re.compile(r'(?:pp\.|pages?)\s*(\d+(?:-\d+)?)', re.IGNORECASE)
+
+# Section labels the extractors look for, found together in one scan of the
+# casefolded text. No label's suffix is another's prefix, so non-overlapping
+# matches still report every label present.
+_SECTION_MARKER_RE = _compile_scan(r'abstract|key|title')
+
+
+def _iter_lines(text: str, limit: int, endpos: Optional[int] = None):
+    """Yield the first `limit` lines of text[:endpos], like
+    text[:endpos].split('\n')[:limit] but without splitting the whole string.
+    """
+    end = len(text) if endpos is None else min(endpos, len(text))
+    start = 0
+    for _ in range(limit):
+        newline = text.find('\n', start, end)
+        if newline == -1:
+            yield text[start:end]
+            return
+        yield text[start:newline]
+        start = newline + 1
+
+
+def _split_authors(line: str):
+    """Split an author line on commas and a whitespace-delimited "and" (', and'
+    counts once). Whitespace inside each name is collapsed to single spaces,
+    as PDF text often has doubled spaces or tabs.
+    """
+    for part in line.split(','):
+        words = part.split()
+        if words[:1] == ['and']:
+            del words[0]
+        name = []
+        for word in words:
+            if word == 'and' and name:
+                yield ' '.join(name)
+                name = []
+            else:
+                name.append(word)
+        yield ' '.join(name)
+
+
+def _is_author_name(candidate: str) -> bool:
+    """First and last name made of ASCII letters, dots, hyphens and apostrophes."""
+    if len(candidate) <= 3 or ' ' not in candidate:
+        return False
+    rest = candidate.translate(_NAME_CHARS)
+    return not rest or rest.isspace()
+
+
 class MetadataExtractor:
     """Enhanced metadata extraction for academic documents."""
     
-    # DOI patterns (more comprehensive)
-    DOI_PATTERNS = [
-        r'10\.\d{4,}[^\s<>\[\]\"\']*',  # Standard DOI format
-        r'doi:\s*10\.\d{4,}[^\s<>\[\]\"\']*',  # DOI with prefix
-        r'DOI:\s*10\.\d{4,}[^\s<>\[\]\"\']*',  # DOI with uppercase prefix
-        r'https?://doi\.org/10\.\d{4,}[^\s<>\[\]\"\']*',  # DOI URLs
-        r'dx\.doi\.org/10\.\d{4,}[^\s<>\[\]\"\']*',  # dx.doi.org URLs
-    ]
-    
-    # Author patterns
-    AUTHOR_PATTERNS = [
-        r'(?:Authors?|By):\s*([^\n\r]+)',
-        r'(?:^|\n)\s*([A-Z][a-z]+(?:\s+[A-Z]\.?\s*)*[A-Z][a-z]+(?:\s*,\s*[A-Z][a-z]+(?:\s+[A-Z]\.?\s*)*[A-Z][a-z]+)*)',
-    ]
-    
     # Title patterns (for extracting potential titles)
     TITLE_INDICATORS = [
         'title', 'heading', 'h1', 'h2'
@@ -57,6 +190,22 @@ class MetadataExtractor:
     def __init__(self):
         self.pdf_available = PDF_AVAILABLE
         self.bs4_available = BS4_AVAILABLE
+        # (text, markers) for the last text scanned; one tuple so the pair is
+        # replaced atomically
+        self._markers_cache = (None, frozenset())
+    
+    def _section_markers(self, text: str) -> frozenset:
+        """Section labels present anywhere in the text, case-insensitively.
+        
+        The extractors use these to skip regex scans for sections the document
+        doesn't have; the scan runs once per text however many extractors ask.
+        """
+        cached_text, markers = self._markers_cache
+        if cached_text is not text:
+            # casefold matches what IGNORECASE treats as equal
+            markers = frozenset(_SECTION_MARKER_RE.findall(text.casefold()))
+            self._markers_cache = (text, markers)
+        return markers
     
     def extract_metadata_from_text(self, text: str, filename: str = None) -> Dict[str, Any]:
         """Extract comprehensive metadata from document text."""
@@ -119,7 +268,7 @@ class MetadataExtractor:
             # Convert first hyphen to forward slash to create DOI
             doi = base_name.replace('-', '/', 1)
             # Validate DOI format
-            if re.match(r'^10\.\d{4,}/', doi):
+            if _DOI_VALID.match(doi):
                 return doi
         
         return None
@@ -129,22 +278,18 @@ class MetadataExtractor:
         if not text:
             return None
         
-        # Look in the first part of the document (more likely to contain DOI)
-        search_text = text[:5000]  # First 5000 characters
-        
-        for pattern in self.DOI_PATTERNS:
-            matches = re.findall(pattern, search_text, re.IGNORECASE | re.MULTILINE)
-            if matches:
-                # Clean up the DOI
-                doi = matches[0]
-                # Remove prefixes
-                doi = re.sub(r'^(doi:?|DOI:?)\s*', '', doi, flags=re.IGNORECASE)
-                doi = re.sub(r'^https?://(?:dx\.)?doi\.org/', '', doi, flags=re.IGNORECASE)
-                # Remove common trailing punctuation and whitespace
-                doi = re.sub(r'[.,;:\s\[\]\"\'<>]+$', '', doi)
-                # Validate DOI format
-                if re.match(r'^10\.\d{4,}/', doi):
-                    return doi
+        # Every DOI starts with "10."; most documents without one stop here
+        if text.find('10.', 0, 5000) == -1:
+            return None
+        
+        # Look in the first 5000 characters (more likely to contain DOI); endpos
+        # bounds the scan without copying a slice
+        for match in _DOI_COMBINED.finditer(text, 0, 5000):
+            # Remove common trailing punctuation and whitespace
+            doi = _DOI_TRAIL.sub('', match.group('doi'))
+            # Validate DOI format
+            if _DOI_VALID.match(doi):
+                return doi
         
         return None
     
@@ -153,22 +298,21 @@ class MetadataExtractor:
         if not text:
             return None
         
-        lines = text.split('\n')
         potential_titles = []
         
         # Strategy 1: Look for lines that might be titles (early in document, proper length)
-        for i, line in enumerate(lines[:20]):  # Check first 20 lines
+        for i, line in enumerate(_iter_lines(text, 20)):  # Check first 20 lines
             clean_line = line.strip()
             # Skip very short lines, page numbers, headers
             if (20 <= len(clean_line) <= 200 and 
-                not re.match(r'^\d+$', clean_line) and  # Not just a number
-                not re.match(r'^page\s+\d+', clean_line, re.IGNORECASE) and  # Not page number
+                not _NUMBER_LINE_RE.match(clean_line) and  # Not just a number
+                not _PAGE_LINE_RE.match(clean_line) and  # Not page number
                 not clean_line.isupper() and  # Not all caps (likely header)
-                '.' not in clean_line[:10]):  # Doesn't start with enumeration
+                not _ENUM_START_RE.match(clean_line)):  # Doesn't start with enumeration
                 potential_titles.append((clean_line, i))
         
         # Strategy 2: Look for "Title:" patterns
-        title_match = re.search(r'(?:^|\n)\s*(?:Title|TITLE):\s*([^\n\r]+)', text, re.MULTILINE)
+        title_match = _TITLE_LABEL_RE.search(text) if 'title' in self._section_markers(text) else None
         if title_match:
             return title_match.group(1).strip()
         
@@ -182,10 +326,10 @@ class MetadataExtractor:
         if filename:
             title = Path(filename).stem
             # Clean filename to make it more readable
-            title = re.sub(r'[_-]+', ' ', title)
-            title = re.sub(r'\s+', ' ', title)
+            title = _UNDERSCORE_HYPHEN_RE.sub(' ', title)
+            title = _WHITESPACE_RE.sub(' ', title)
             # Remove common academic paper patterns from filename
-            title = re.sub(r'\d{4}[a-zA-Z]*\s*', '', title)  # Remove years
+            title = _FILENAME_YEAR_RE.sub('', title)  # Remove years
             return title.strip().title() if title.strip() else None
         
         return None
@@ -195,14 +339,15 @@ class MetadataExtractor:
         if not text:
             return None
         
-        authors = []
-        
-        # Look in the first part of the document
-        search_text = text[:3000]
+        # Keyed by lowercased name, so duplicates collapse onto the first
+        # spelling seen while preserving order
+        authors = {}
         
+        # Look in the first 3000 characters; endpos bounds each scan without
+        # copying a slice
         # Strategy 1: Look for "Author(s):" patterns
-        for pattern in self.AUTHOR_PATTERNS:
-            matches = re.findall(pattern, search_text, re.MULTILINE)
+        for pattern in _AUTHOR_RES:
+            matches = pattern.findall(text, 0, 3000)
             for match in matches:
                 if isinstance(match, tuple):
                     if not match:
@@ -213,74 +358,58 @@ class MetadataExtractor:
                 author_line = match.strip()
                 if len(author_line) > 5 and len(author_line) < 300:  # Reasonable length
                     # Split by common delimiters
-                    potential_authors = re.split(r',\s*(?:and\s+)?|;\s*|\s+and\s+', author_line)
-                    for author in potential_authors:
+                    for author in _split_authors(author_line.replace(';', ',')):
                         clean_author = author.strip()
                         # Basic validation: has at least first and last name
-                        if (len(clean_author) > 3 and 
-                            ' ' in clean_author and 
-                            re.match(r'^[A-Za-z\s\.\-\']+$', clean_author)):
-                            authors.append(clean_author)
+                        if _is_author_name(clean_author):
+                            authors.setdefault(clean_author.lower(), clean_author)
         
         # Strategy 2: Look for name patterns early in document
         # This is more heuristic and might have false positives
-        lines = search_text.split('\n')
-        for i, line in enumerate(lines[:15]):  # First 15 lines
+        for i, line in enumerate(_iter_lines(text, 15, 3000)):  # First 15 lines
             line = line.strip()
             # Look for lines that might contain author names
             if (10 <= len(line) <= 100 and
-                not re.search(r'\b(?:abstract|introduction|keywords|doi)\b', line, re.IGNORECASE) and
-                re.search(r'^[A-Z][a-z]+(?:\s+[A-Z]\.?)?\s+[A-Z][a-z]+', line)):
+                _NAME_START_RE.match(line) and
+                not self._has_section_word(line)):
                 # Could be an author line
-                potential_authors = re.split(r',\s*(?:and\s+)?|\s+and\s+', line)
-                for author in potential_authors[:3]:  # Limit to 3 to avoid false positives
+                potential_authors = islice(_split_authors(line), 3)
+                for author in potential_authors:  # Limit to 3 to avoid false positives
                     clean_author = author.strip()
-                    if (len(clean_author) > 3 and 
-                        ' ' in clean_author and
-                        re.match(r'^[A-Za-z\s\.\-\']+$', clean_author)):
-                        authors.append(clean_author)
+                    if _is_author_name(clean_author):
+                        authors.setdefault(clean_author.lower(), clean_author)
                 break  # Only check the first potential author line
         
-        # Remove duplicates while preserving order
-        unique_authors = []
-        seen = set()
-        for author in authors:
-            if author.lower() not in seen:
-                unique_authors.append(author)
-                seen.add(author.lower())
-        
-        return unique_authors if unique_authors else None
+        return list(authors.values()) if authors else None
+    
+    @staticmethod
+    def _has_section_word(line: str) -> bool:
+        """Whether the line contains a section word such as "Abstract" as a whole word."""
+        low = line.lower()
+        # Substring checks rule out almost every line; the regex only confirms
+        # word boundaries when one of the words occurs
+        if not any(word in low for word in _SECTION_WORDS):
+            return False
+        return _SECTION_WORD_RE.search(line) is not None
     
     def extract_publication_year(self, text: str) -> Optional[int]:
         """Extract publication year from text."""
         if not text:
             return None
         
-        # Look in the first part of the document
-        search_text = text[:2000]
-        
-        # Look for year patterns near publication-related keywords
-        patterns = [
-            r'(?:published|copyright|©)\s*(?:in\s*)?(\d{4})',
-            r'(\d{4})\s*(?:all rights reserved|copyright|©)',
-            r'(?:^|\n)\s*(\d{4})\s*(?:\n|$)',  # Year on its own line
-            r'\b(19\d{2}|20[0-2]\d)\b',  # General 4-digit year pattern
-        ]
-        
-        years = []
-        for pattern in patterns:
-            matches = re.findall(pattern, search_text, re.IGNORECASE | re.MULTILINE)
-            for match in matches:
-                try:
-                    year = int(match)
-                    if 1900 <= year <= 2030:  # Reasonable year range
-                        years.append(year)
-                except ValueError:
-                    continue
-        
-        if years:
-            # Return the most recent reasonable year
-            return max(years)
+        # Look for year patterns near publication-related keywords, in the
+        # first 2000 characters. Patterns are ordered from most to least
+        # specific; the first one that yields a reasonable year wins, so the
+        # general 4-digit scan only runs when nothing labels the year
+        for pattern in _YEAR_RES:
+            latest = None
+            for match in pattern.finditer(text, 0, 2000):
+                year = int(match.group(1))
+                if 1900 <= year <= 2030 and (latest is None or year > latest):
+                    latest = year
+            if latest is not None:
+                # Return the most recent reasonable year
+                return latest
         
         return None
     
@@ -289,21 +418,17 @@ class MetadataExtractor:
         if not text:
             return None
         
+        if 'abstract' not in self._section_markers(text):
+            return None
+        
         # Look for abstract section
-        abstract_patterns = [
-            r'(?:^|\n)\s*ABSTRACT\s*:?\s*\n(.*?)(?:\n\s*(?:Keywords?|Introduction|1\.|I\.|\n\s*\n))',
-            r'(?:^|\n)\s*Abstract\s*:?\s*\n(.*?)(?:\n\s*(?:Keywords?|Introduction|1\.|I\.|\n\s*\n))',
-            r'(?:^|\n)\s*abstract\s*:?\s*\n(.*?)(?:\n\s*(?:keywords?|introduction|1\.|i\.|\n\s*\n))',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.DOTALL | re.IGNORECASE)
-            if match:
-                abstract = match.group(1).strip()
-                # Clean up the abstract
-                abstract = re.sub(r'\s+', ' ', abstract)  # Normalize whitespace
-                if 50 <= len(abstract) <= 2000:  # Reasonable abstract length
-                    return abstract
+        match = _ABSTRACT_RE.search(text)
+        if match:
+            abstract = match.group(1).strip()
+            # Clean up the abstract
+            abstract = _WHITESPACE_RE.sub(' ', abstract)  # Normalize whitespace
+            if 50 <= len(abstract) <= 2000:  # Reasonable abstract length
+                return abstract
         
         return None
     
@@ -312,19 +437,17 @@ class MetadataExtractor:
         if not text:
             return None
         
+        # Every keywords label starts with "key"
+        if 'key' not in self._section_markers(text):
+            return None
+        
         # Look for keywords section
-        keyword_patterns = [
-            r'(?:^|\n)\s*KEYWORDS?\s*:?\s*([^\n]+)',
-            r'(?:^|\n)\s*Keywords?\s*:?\s*([^\n]+)',
-            r'(?:^|\n)\s*Key\s*words?\s*:?\s*([^\n]+)',
-        ]
-        
-        for pattern in keyword_patterns:
-            match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
+        for pattern in _KEYWORD_RES:
+            match = pattern.search(text)
             if match:
                 keywords_text = match.group(1).strip()
                 # Split keywords by common delimiters
-                keywords = re.split(r'[,;]\s*', keywords_text)
+                keywords = _KEYWORD_SPLIT_RE.split(keywords_text)
                 # Clean keywords
                 clean_keywords = []
                 for keyword in keywords:
@@ -343,40 +466,48 @@ class MetadataExtractor:
         if not text:
             return journal_info
         
-        # Look in first part of document
-        search_text = text[:2000]
-        
+        # Look in the first 2000 characters
         # Journal name patterns
-        journal_patterns = [
-            r'(?:^|\n)\s*([A-Z][^.\n]+Journal[^.\n]*)',
-            r'(?:^|\n)\s*([A-Z][^.\n]+Review[^.\n]*)',
-            r'(?:^|\n)\s*([A-Z][^.\n]+Proceedings[^.\n]*)',
-            r'(?:Published in|Appears in):\s*([^\n]+)',
-        ]
-        
-        for pattern in journal_patterns:
-            match = re.search(pattern, search_text, re.IGNORECASE | re.MULTILINE)
+        for pattern in _JOURNAL_RES:
+            match = pattern.search(text, 0, 2000)
             if match:
                 journal_name = match.group(1).strip()
                 if 10 <= len(journal_name) <= 100:  # Reasonable length
                     journal_info['journal'] = journal_name
                 break
         
-        # Volume, issue, pages patterns
-        volume_match = re.search(r'(?:Vol\.|Volume)\s*(\d+)', search_text, re.IGNORECASE)
+        # Volume, issue, pages patterns, each skipped when its label is absent
+        low = text[:2000].casefold()
+        volume_match = _VOLUME_RE.search(text, 0, 2000) if 'vol' in low else None
         if volume_match:
             journal_info['volume'] = volume_match.group(1)
         
-        issue_match = re.search(r'(?:No\.|Issue)\s*(\d+)', search_text, re.IGNORECASE)
+        issue_match = _ISSUE_RE.search(text, 0, 2000) if 'no.' in low or 'issue' in low else None
         if issue_match:
             journal_info['issue'] = issue_match.group(1)
         
-        pages_match = re.search(r'(?:pp\.|pages?)\s*(\d+(?:-\d+)?)', search_text, re.IGNORECASE)
+        pages_match = _PAGES_RE.search(text, 0, 2000) if 'pp.' in low or 'page' in low else None
         if pages_match:
             journal_info['pages'] = pages_match.group(1)
         
         return journal_info
     
+    def _read_pdf_info(self, file_path: str) -> Dict[str, Any]:
+        """Read the PDF document info dictionary, keyed without the leading slash."""
+        if PDFIUM_AVAILABLE:
+            # PDFium only needs the trailer and info dict, without parsing
+            # every object the way the pure-Python reader does
+            pdf = pdfium.PdfDocument(file_path)
+            try:
+                return pdf.get_metadata_dict(skip_empty=True)
+            finally:
+                pdf.close()
+        
+        pdf_reader = get_pdf_reader(file_path)
+        if not pdf_reader.metadata:
+            return {}
+        return {key.lstrip('/'): value for key, value in pdf_reader.metadata.items()}
+    
     def extract_metadata_from_pdf_properties(self, file_path: str) -> Dict[str, Any]:
         """Extract metadata from PDF properties if available."""
         metadata = {}
@@ -385,34 +516,36 @@ class MetadataExtractor:
             return metadata
         
         try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                
-                if pdf_reader.metadata:
-                    info = pdf_reader.metadata
-                    
-                    # Extract standard PDF metadata
-                    if info.get('/Title'):
-                        metadata['pdf_title'] = str(info['/Title'])
-                    
-                    if info.get('/Author'):
-                        metadata['pdf_author'] = str(info['/Author'])
-                    
-                    if info.get('/Subject'):
-                        metadata['pdf_subject'] = str(info['/Subject'])
-                    
-                    if info.get('/Keywords'):
-                        keywords = str(info['/Keywords'])
-                        metadata['pdf_keywords'] = [k.strip() for k in keywords.split(',') if k.strip()]
-                    
-                    if info.get('/CreationDate'):
-                        creation_date = str(info['/CreationDate'])
-                        # Try to extract year from creation date
-                        year_match = re.search(r'(\d{4})', creation_date)
-                        if year_match:
-                            metadata['pdf_creation_year'] = int(year_match.group(1))
+            info = self._read_pdf_info(file_path)
+            
+            # Extract standard PDF metadata
+            if info.get('Title'):
+                metadata['pdf_title'] = str(info['Title'])
+            
+            if info.get('Author'):
+                metadata['pdf_author'] = str(info['Author'])
+            
+            if info.get('Subject'):
+                metadata['pdf_subject'] = str(info['Subject'])
+            
+            if info.get('Keywords'):
+                keywords = str(info['Keywords'])
+                metadata['pdf_keywords'] = [k.strip() for k in keywords.split(',') if k.strip()]
+            
+            if info.get('CreationDate'):
+                creation_date = str(info['CreationDate'])
+                # Try to extract year from creation date
+                year_match = _PDF_DATE_YEAR_RE.search(creation_date)
+                if year_match:
+                    metadata['pdf_creation_year'] = int(year_match.group(1))
         
         except Exception as e:
             logger.warning(f"Could not extract PDF metadata from {file_path}: {e}")
         
-        return metadata
\ No newline at end of file
+        return metadata
+
+
+# The extractor holds no per-document state beyond a thread-safe marker
+# cache, so one shared instance serves every caller
+DEFAULT_EXTRACTOR = MetadataExtractor()
+extract_metadata_from_text = DEFAULT_EXTRACTOR.extract_metadata_from_text
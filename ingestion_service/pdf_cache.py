@@ -0,0 +1,27 @@
+"""Parsed PDF readers shared by text and metadata extraction."""
+
+import os
+from functools import lru_cache
+
+try:
+    import pypdf
+except ImportError:
+    # Older images ship the package under its previous name
+    import PyPDF2 as pypdf
+
+
+@lru_cache(maxsize=8)
+def _load_pdf_reader(file_path, mtime):
+    # Given a path, PdfReader reads the whole file into memory, so the cached
+    # reader doesn't depend on an open file handle
+    return pypdf.PdfReader(file_path)
+
+
+def get_pdf_reader(file_path):
+    """Return a parsed PdfReader for the file, reused until the file changes.
+    
+    A document is checked for searchable text, has its text extracted and its
+    properties read, all by the same worker thread; parsing it once serves all
+    three. The cache is keyed on modification time so edited files are re-read.
+    """
+    return _load_pdf_reader(file_path, os.path.getmtime(file_path))
@@ -1,51 +1,107 @@
 #!/usr/bin/env python3
 import argparse
+import asyncio
 import json
-from typing import List
+from itertools import islice
+from typing import Iterator
 
 from api_service.utils import get_db_connection, Config
 from api_service.services.qa_service import RetrievalEvaluator
 from api_service.services.query_service import QueryService
 
+# Rows read per page; their missing embeddings are created in one request
+EMBED_BATCH_SIZE = 64
 
-def fetch_recent_query_cache(limit: int) -> List[dict]:
+
+def fetch_recent_query_cache(limit: int) -> Iterator[dict]:
+    """Yield recent query_cache rows with their stored query embeddings.
+
+    Rows stream from a server-side cursor, so large limits aren't buffered.
+    The embedding is cast to real[] so it arrives as a list of floats with or
+    without the pgvector adapter.
+    """
     with get_db_connection() as conn:
-        with conn.cursor() as cursor:
+        with conn.cursor(name="backfill_query_cache") as cursor:
+            cursor.itersize = 500
             cursor.execute(
                 """
-                SELECT id, query_text 
+                SELECT id, query_text, query_embedding::real[] AS embedding
                 FROM query_cache 
                 ORDER BY created_at DESC 
                 LIMIT %s
                 """,
                 (limit,)
             )
-            return cursor.fetchall()
+            yield from cursor
 
 
-def backfill(limit: int, max_results: int, use_llm: bool):
+async def backfill_async(limit: int, max_results: int, use_llm: bool, concurrency: int = 16):
     evaluator = RetrievalEvaluator()
     q = QueryService()
-
     entries = fetch_recent_query_cache(limit)
-    for entry in entries:
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+
+    # Reads pages of rows and embeds the queries that have no stored
+    # embedding with one batched request per page, then hands rows to workers
+    async def produce():
+        try:
+            while page := await asyncio.to_thread(lambda: list(islice(entries, EMBED_BATCH_SIZE))):
+                missing = [entry for entry in page if entry["embedding"] is None]
+                if missing:
+                    try:
+                        embeddings = await asyncio.to_thread(
+                            q.create_embeddings_batch, [entry["query_text"] for entry in missing]
+                        )
+                        for entry, embedding in zip(missing, embeddings):
+                            entry["embedding"] = embedding
+                    except Exception as e:
+                        # Rows left without an embedding are embedded one by one
+                        print(f"Batch embedding failed, embedding queries individually: {e}")
+                for entry in page:
+                    await queue.put(entry)
+        except Exception as e:
+            print(f"Error reading query_cache, stopping after the rows already queued: {e}")
+        finally:
+            # Workers always get their stop signal, so buffered rows are flushed
+            for _ in range(concurrency):
+                await queue.put(None)
+
+    async def process(entry: dict):
         query_id = entry["id"]
         query_text = entry["query_text"]
         print(f"Backfilling retrieval evals for query_id={query_id}")
 
         # Re-run vector retrieval for reproducible ranking
-        embedding = q.create_embedding(query_text)
-        chunks = q.vector_search(embedding, max_results)
+        embedding = entry["embedding"]
+        if embedding is None:
+            embedding = await asyncio.to_thread(q.create_embedding_cached, query_text)
+        chunks = await q.vector_search_async(embedding, max_results)
 
         # Vector judgments
         judgments = evaluator.relevance.evaluate_ranked_list(query_text, chunks)
         evaluator.persist_retrieval_evaluations(query_id, judgments)
 
-        # Optional LLM judgments
+        # Optional LLM judgments, written as they complete
         if use_llm:
-            import asyncio
-            llm_judgments = asyncio.run(evaluator.evaluate_llm_retrieval(query_text, chunks))
-            evaluator.persist_retrieval_evaluations(query_id, llm_judgments)
+            await evaluator.evaluate_and_persist_llm_retrieval(query_id, query_text, chunks)
+
+    # `concurrency` workers pull entries as they go, so search and LLM calls
+    # overlap without a task per row
+    async def worker():
+        while (entry := await queue.get()) is not None:
+            # One failing query must not abort the run and drop other queries' rows
+            try:
+                await process(entry)
+            except Exception as e:
+                print(f"Error backfilling query_id={entry['id']}: {e}")
+
+    # Rows from all queries are written together with COPY
+    with evaluator.buffered_writes():
+        await asyncio.gather(produce(), *(worker() for _ in range(concurrency)))
+
+
+def backfill(limit: int, max_results: int, use_llm: bool, concurrency: int = 16):
+    asyncio.run(backfill_async(limit, max_results, use_llm, concurrency))
 
 
 if __name__ == "__main__":
@@ -53,6 +109,7 @@ if __name__ == "__main__":
     parser.add_argument("--limit", type=int, default=50, help="Number of recent query_cache entries")
     parser.add_argument("--max_results", type=int, default=10, help="Top-N chunks to evaluate")
     parser.add_argument("--use-llm", action="store_true", help="Include LLM-based judgments")
+    parser.add_argument("--concurrency", type=int, default=16, help="Query entries processed concurrently")
     args = parser.parse_args()
 
-    backfill(args.limit, args.max_results, args.use_llm) 
\ No newline at end of file
+    backfill(args.limit, args.max_results, args.use_llm, args.concurrency) 
\ No newline at end of file
@@ -407,6 +407,57 @@ class QATestSuite:
             duration = time.time() - start_time
             self.log_test("Verification - False Answer Detection", "ERROR", duration, {"error": str(e)})
     
+    def test_query_stream(self):
+        """Test 10: Streamed query sends token events before the final result"""
+        start_time = time.time()
+        try:
+            payload = {
+                "query": "How does heat stress affect dairy cattle productivity?",
+                "max_results": 3,
+                "use_memory": False,
+                "use_amplification": False
+            }
+            
+            response = self.session.post(
+                f"{self.base_url}/query/stream",
+                json=payload,
+                timeout=TIMEOUT,
+                stream=True
+            )
+            
+            event_types = []
+            first_token_at = None
+            answer = ""
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                event_types.append(event["type"])
+                if event["type"] == "token" and first_token_at is None:
+                    first_token_at = time.time() - start_time
+                if event["type"] == "result":
+                    answer = event["data"].get("answer", "")
+            
+            duration = time.time() - start_time
+            
+            token_count = event_types.count("token")
+            details = {
+                "token_events": token_count,
+                "first_token_at": first_token_at,
+                "final_event": event_types[-1] if event_types else None
+            }
+            # Tokens must arrive before the single result event, which ends the stream
+            if (response.status_code == 200 and token_count > 0 and
+                event_types[-1] == "result" and "result" not in event_types[:-1] and answer):
+                self.log_test("Streaming Query - Tokens Before Result", "PASS", duration, details)
+            else:
+                details["status_code"] = response.status_code
+                self.log_test("Streaming Query - Tokens Before Result", "FAIL", duration, details)
+                
+        except Exception as e:
+            duration = time.time() - start_time
+            self.log_test("Streaming Query - Tokens Before Result", "ERROR", duration, {"error": str(e)})
+    
     def run_all_tests(self):
         """Run all test cases"""
         print("Starting Enhanced QA System Test Suite")
@@ -421,7 +472,8 @@ class QATestSuite:
             self.test_enhanced_query_agricultural_technology,
             self.test_security_prompt_injection,
             self.test_enhanced_query_economic_impact,
-            self.test_verification_false_answer
+            self.test_verification_false_answer,
+            self.test_query_stream
         ]
         
         for test in tests:
@@ -7,6 +7,7 @@ Test script to verify:
 
 import asyncio
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import os
 from pathlib import Path
@@ -15,10 +16,14 @@ from pathlib import Path
 API_BASE = "http://localhost:8001"  # ILRI instance
 MAIN_API_BASE = "http://localhost:8000"  # Main instance
 
+# One keep-alive session shared by all checks
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+
 def test_api_health():
     """Test if ILRI API is running"""
     try:
-        response = requests.get(f"{API_BASE}/health", timeout=5)
+        response = SESSION.get(f"{API_BASE}/health", timeout=5)
         print(f"✅ ILRI API Health: {response.status_code}")
         return True
     except Exception as e:
@@ -36,7 +41,7 @@ def test_haiku_verification():
     
     try:
         print("\n🧪 Testing Haiku verification...")
-        response = requests.post(f"{API_BASE}/query/verify-answer", json=test_data, timeout=30)
+        response = SESSION.post(f"{API_BASE}/query/verify-answer", json=test_data, timeout=30)
         
         if response.status_code == 200:
             result = response.json()
@@ -64,7 +69,7 @@ def test_openai_verification_comparison():
     
     try:
         print("\n🧪 Testing OpenAI verification for comparison...")
-        response = requests.post(f"{API_BASE}/query/verify-answer", json=test_data, timeout=30)
+        response = SESSION.post(f"{API_BASE}/query/verify-answer", json=test_data, timeout=30)
         
         if response.status_code == 200:
             result = response.json()
@@ -92,7 +97,7 @@ def check_ilri_documents():
             "use_memory": False
         }
         
-        response = requests.post(f"{API_BASE}/query", json=test_query, timeout=30)
+        response = SESSION.post(f"{API_BASE}/query", json=test_query, timeout=30)
         
         if response.status_code == 200:
             result = response.json()
@@ -135,7 +140,7 @@ def check_grobid_service():
     """Check if GROBID service is running"""
     try:
         print("\n🔬 Checking GROBID service...")
-        response = requests.get("http://localhost:8070/api/isalive", timeout=5)
+        response = SESSION.get("http://localhost:8070/api/isalive", timeout=5)
         
         if response.status_code == 200:
             print("✅ GROBID service is running")
@@ -160,7 +165,7 @@ def test_query_with_haiku():
     
     try:
         print("\n🧪 Testing full query with Haiku verification...")
-        response = requests.post(f"{API_BASE}/query", json=test_query, timeout=60)
+        response = SESSION.post(f"{API_BASE}/query", json=test_query, timeout=60)
         
         if response.status_code == 200:
             result = response.json()